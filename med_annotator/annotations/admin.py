@@ -1,3 +1,265 @@
-from django.contrib import admin
+from collections import defaultdict
 
-# Register your models here.
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .cohorts import materialize
+from .models import (
+    Patient, PatientImage, Annotation, AnnotationChange, CaseComment, Cohort, Project,
+)
+
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATE_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate for unfiltered changelists on
+    PostgreSQL instead of a full COUNT(*). Falls back to an exact count
+    for filtered lists, small tables and other databases.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        connection = connections[qs.db]
+        if connection.vendor == "postgresql" and not qs.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [qs.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATE_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+def count_subquery(model, field="patient"):
+    """Correlated COUNT per patient, avoiding JOIN fan-out in the changelist."""
+    counts = (
+        model.objects
+        .filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def record_bulk_changes(annotation_ids, delta, changed_at):
+    """Keep annotation history complete for queryset.update() actions."""
+    AnnotationChange.objects.bulk_create(
+        AnnotationChange(annotation_id=pk, changed_at=changed_at, delta=delta)
+        for pk in annotation_ids
+    )
+
+
+# ================================
+# Project
+# ================================
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    list_display = ("slug", "name", "drive_folder_id", "sync_interval", "last_synced_at", "patient_count")
+    prepopulated_fields = {"slug": ("name",)}
+    readonly_fields = ("last_synced_at",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(patient_count=Count("patients"))
+
+    @admin.display(ordering="patient_count", description="Patients")
+    def patient_count(self, obj):
+        return obj.patient_count
+
+
+# ================================
+# Patient
+# ================================
+@admin.register(Patient)
+class PatientAdmin(LargeTableAdmin):
+    list_display = ("patient_id", "project", "created_at", "image_count", "annotation_count")
+    list_filter = ("project",)
+    list_select_related = ("project",)
+    search_fields = ("patient_id",)
+    ordering = ("patient_id",)
+    actions = ["resync_from_drive"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            image_count=count_subquery(PatientImage),
+            annotation_count=count_subquery(Annotation),
+        )
+
+    @admin.display(ordering="image_count", description="Images")
+    def image_count(self, obj):
+        return obj.image_count
+
+    @admin.display(ordering="annotation_count", description="Annotations")
+    def annotation_count(self, obj):
+        return obj.annotation_count
+
+    @admin.action(description="Re-sync selected patients from Drive")
+    def resync_from_drive(self, request, queryset):
+        # Imported here so the admin does not pull in the Drive client
+        from .drive_sync import sync_drive
+
+        by_project = defaultdict(list)
+        for project_id, patient_id in queryset.values_list("project_id", "patient_id"):
+            by_project[project_id].append(patient_id)
+
+        for project in Project.objects.filter(pk__in=by_project):
+            patient_ids = by_project[project.pk]
+            try:
+                sync_drive(project, patient_ids=patient_ids)
+            except Exception as e:
+                self.message_user(
+                    request, f"{project}: Drive sync failed: {e}", messages.ERROR
+                )
+                continue
+            self.message_user(request, f"{project}: re-synced {len(patient_ids)} patient(s).")
+
+
+# ================================
+# PatientImage
+# ================================
+@admin.register(PatientImage)
+class PatientImageAdmin(LargeTableAdmin):
+    list_display = ("id", "patient", "stage", "checksum", "image_url")
+    list_filter = ("stage",)
+    list_select_related = ("patient",)
+    raw_id_fields = ("patient",)
+    search_fields = ("patient__patient_id", "checksum")
+
+
+# ================================
+# Annotation
+# ================================
+class ReassignActionForm(ActionForm):
+    target_user = forms.ModelChoiceField(
+        queryset=get_user_model().objects.order_by("username"),
+        required=False,
+        label="Reassign to"
+    )
+
+
+@admin.register(Annotation)
+class AnnotationAdmin(LargeTableAdmin):
+    list_display = (
+        "id", "patient", "user", "vasculitis_present",
+        "activity", "quality", "annotated_at", "submitted_at",
+    )
+    list_filter = ("vasculitis_present", "activity")
+    list_select_related = ("patient", "user")
+    raw_id_fields = ("patient", "user")
+    search_fields = ("patient__patient_id", "user__username")
+    action_form = ReassignActionForm
+    actions = ["reassign", "reset_annotations"]
+
+    @admin.action(description="Reassign selected annotations to user")
+    def reassign(self, request, queryset):
+        target = request.POST.get("target_user")
+        user = get_user_model().objects.filter(pk=target).first() if target else None
+        if user is None:
+            self.message_user(request, "Choose a user to reassign to.", messages.WARNING)
+            return
+
+        # (user, patient) is unique: skip cases the target already has,
+        # and move at most one selected annotation per case
+        movable = (
+            queryset
+            .exclude(patient__in=Annotation.objects.filter(user=user).values("patient"))
+            .order_by()
+            .values("patient")
+            .annotate(first=Min("id"))
+            .values_list("first", flat=True)
+        )
+
+        with transaction.atomic():
+            # Count before updating: a changelist filtered on the old user
+            # no longer matches the rows once they have moved
+            selected = queryset.count()
+            ids = list(movable)
+            updated = Annotation.objects.filter(id__in=ids).update(user=user)
+            record_bulk_changes(ids, {"user_id": user.pk}, timezone.now())
+
+        skipped = selected - updated
+        msg = f"Reassigned {updated} annotation(s) to {user}."
+        if skipped:
+            msg += f" Skipped {skipped} for cases {user} already has."
+        self.message_user(request, msg)
+
+    @admin.action(description="Reset selected annotations")
+    def reset_annotations(self, request, queryset):
+        cleared = {
+            "vasculitis_present": False,
+            "activity": None,
+            "quality": None,
+            "comment": None,
+        }
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(queryset.values_list("id", flat=True))
+            # Back into the readers' queues
+            updated = Annotation.objects.filter(id__in=ids).update(
+                annotated_at=now, submitted_at=None, **cleared
+            )
+            record_bulk_changes(ids, cleared, now)
+
+        self.message_user(request, f"Reset {updated} annotation(s).")
+
+
+# ================================
+# CaseComment
+# ================================
+@admin.register(CaseComment)
+class CaseCommentAdmin(LargeTableAdmin):
+    list_display = ("id", "patient", "user", "created_at", "comment")
+    list_select_related = ("patient", "user")
+    raw_id_fields = ("patient", "user")
+    search_fields = ("patient__patient_id", "comment")
+
+
+# ================================
+# Cohort
+# ================================
+@admin.register(Cohort)
+class CohortAdmin(admin.ModelAdmin):
+    list_display = ("name", "project", "spec", "member_count", "materialized_at")
+    list_filter = ("project",)
+    list_select_related = ("project",)
+    raw_id_fields = ("created_by",)
+    readonly_fields = ("materialized_at",)
+    actions = ["rematerialize"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(member_count=Count("members"))
+
+    @admin.display(ordering="member_count", description="Patients")
+    def member_count(self, obj):
+        return obj.member_count
+
+    @admin.action(description="Re-materialize selected cohorts")
+    def rematerialize(self, request, queryset):
+        for cohort in queryset:
+            try:
+                size = materialize(cohort)
+            except ValueError as e:
+                self.message_user(request, f"{cohort.name}: {e}", messages.ERROR)
+                continue
+            self.message_user(request, f"{cohort.name}: {size} patient(s)")
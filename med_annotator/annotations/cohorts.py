@@ -0,0 +1,191 @@
+# annotations/cohorts.py
+"""
+Cohort filters.
+
+A spec is a dict of filter keys, all of which must match, e.g.
+
+    {"stages_only": ["late"]}
+    {"disagree": "vasculitis_present"}
+    {"quality_lt": 4, "min_images": 3}
+
+compile_spec() turns a spec into a single Patient queryset built from
+correlated EXISTS/COUNT subqueries, which use the (patient, stage) and
+(patient, quality) indexes. materialize() stores the result as ordered
+CohortMember rows so the queue can page through it by position.
+"""
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ACTIVITY_CHOICES, Annotation, CohortMember, Patient, PatientImage
+
+
+STAGES = {stage for stage, _ in PatientImage.STAGE_CHOICES}
+ACTIVITIES = {activity for activity, _ in ACTIVITY_CHOICES}
+DISAGREEMENT_FIELDS = ("vasculitis_present", "activity", "quality")
+
+
+def _images(**filters):
+    return PatientImage.objects.filter(patient=OuterRef("pk"), **filters)
+
+
+def _annotations(**filters):
+    return Annotation.objects.filter(patient=OuterRef("pk"), **filters)
+
+
+def _count(qs, field):
+    counts = (
+        qs.order_by()
+        .values("patient")
+        .annotate(n=Count(field, distinct=True))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _stages(value):
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)) or not all(isinstance(s, str) for s in value):
+        raise ValueError(f"Stages must be a stage name or a list of them, got {value!r}")
+    stages = list(value)
+    unknown = set(stages) - STAGES
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+    return stages
+
+
+def _int(key, value):
+    # bool is an int subclass, but {"min_images": true} is a typo, not a count
+    if isinstance(value, bool):
+        raise ValueError(f"{key} must be an integer, got {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be an integer, got {value!r}") from None
+
+
+def compile_spec(spec, project=None):
+    """
+    Return a Patient queryset matching every key in `spec`. Raises
+    ValueError for anything that is not a valid spec.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Cohort spec must be a JSON object, got {spec!r}")
+
+    qs = Patient.objects.all()
+    if project is not None:
+        qs = qs.filter(project=project)
+
+    for key, value in spec.items():
+        if key == "has_stage":
+            qs = qs.filter(Exists(_images(stage__in=_stages(value))))
+
+        elif key == "stages_only":
+            stages = _stages(value)
+            qs = qs.filter(
+                Exists(_images(stage__in=stages)),
+                ~Exists(_images().exclude(stage__in=stages)),
+            )
+
+        elif key in ("min_images", "max_images"):
+            qs = qs.alias(image_count=_count(_images(), "id"))
+            lookup = "gte" if key == "min_images" else "lte"
+            qs = qs.filter(**{f"image_count__{lookup}": _int(key, value)})
+
+        elif key == "disagree":
+            if not isinstance(value, str) or value not in DISAGREEMENT_FIELDS:
+                raise ValueError(f"Cannot measure disagreement on {value!r}")
+            submitted = _annotations(submitted_at__isnull=False, **{f"{value}__isnull": False})
+            qs = qs.alias(
+                distinct_answers=_count(submitted, value)
+            ).filter(distinct_answers__gt=1)
+
+        elif key in ("quality_lt", "quality_gte"):
+            lookup = "lt" if key == "quality_lt" else "gte"
+            qs = qs.filter(Exists(_annotations(**{f"quality__{lookup}": _int(key, value)})))
+
+        elif key == "activity":
+            if not isinstance(value, str) or value not in ACTIVITIES:
+                raise ValueError(f"Unknown activity: {value!r}")
+            qs = qs.filter(Exists(_annotations(activity=value)))
+
+        elif key == "unannotated":
+            if value:
+                qs = qs.filter(~Exists(_annotations(submitted_at__isnull=False)))
+
+        else:
+            raise ValueError(f"Unknown cohort filter: {key}")
+
+    return qs
+
+
+def materialize(cohort):
+    """Recompute the cohort's ordered member list. Returns its size."""
+    patient_pks = list(
+        compile_spec(cohort.spec, project=cohort.project)
+        .order_by("patient_id")
+        .values_list("pk", flat=True)
+    )
+
+    with transaction.atomic():
+        CohortMember.objects.filter(cohort=cohort).delete()
+        CohortMember.objects.bulk_create(
+            CohortMember(cohort=cohort, patient_id=pk, position=i)
+            for i, pk in enumerate(patient_pks)
+        )
+        cohort.materialized_at = timezone.now()
+        cohort.save(update_fields=["materialized_at"])
+
+    return len(patient_pks)
+
+
+# ================================
+# Keyset navigation
+# ================================
+def members(cohort):
+    return CohortMember.objects.filter(cohort=cohort)
+
+
+def first_unannotated(cohort, user):
+    """First member, by position, the user has not annotated yet."""
+    return (
+        members(cohort)
+        .exclude(
+            patient__in=Annotation.objects.filter(
+                user=user, submitted_at__isnull=False
+            ).values("patient")
+        )
+        .order_by("position")
+        .values_list("patient__patient_id", flat=True)
+        .first()
+    )
+
+
+def neighbours(cohort, patient_id):
+    """(prev_patient_id, next_patient_id) around `patient_id` in the cohort."""
+    position = (
+        members(cohort)
+        .filter(patient__patient_id=patient_id)
+        .values_list("position", flat=True)
+        .first()
+    )
+    if position is None:
+        return None, None
+
+    prev_id = (
+        members(cohort)
+        .filter(position__lt=position)
+        .order_by("-position")
+        .values_list("patient__patient_id", flat=True)
+        .first()
+    )
+    next_id = (
+        members(cohort)
+        .filter(position__gt=position)
+        .order_by("position")
+        .values_list("patient__patient_id", flat=True)
+        .first()
+    )
+    return prev_id, next_id
@@ -0,0 +1,181 @@
+# annotations/drive_sync.py
+"""
+Google Drive sync.
+
+The Google API client is slow to import, so it is only loaded when a sync
+actually runs. Keep module-level imports here limited to Django and the
+standard library so workers and manage.py commands do not pay for it.
+"""
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Patient, PatientImage, Project
+
+
+# ================================
+# Constants
+# ================================
+FOLDER_MIME = "application/vnd.google-apps.folder"
+STAGE_REGEX = re.compile(r"(early|mid|late)", re.IGNORECASE)
+
+# Modules that must stay out of the request path (see tests.py)
+HEAVY_MODULES = ("googleapiclient", "google.oauth2", "google.auth")
+
+
+def build_drive_service(service_account_file):
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
+    credentials = service_account.Credentials.from_service_account_file(
+        service_account_file,
+        scopes=["https://www.googleapis.com/auth/drive.readonly"]
+    )
+
+    return build("drive", "v3", credentials=credentials)
+
+
+# ================================
+# Recursive Google Drive Scanner
+# ================================
+def fetch_images_recursive(service, folder_id, patient, collected, folder_name="", seen=None):
+    results = service.files().list(
+        q=f"'{folder_id}' in parents and trashed=false",
+        fields="files(id, name, mimeType, md5Checksum)"
+    ).execute()
+
+    for f in results.get("files", []):
+
+        # Recurse into subfolders
+        if f["mimeType"] == FOLDER_MIME:
+            fetch_images_recursive(
+                service,
+                f["id"],
+                patient,
+                collected,
+                folder_name=f["name"],
+                seen=seen
+            )
+            continue
+
+        # Ignore non-images
+        if not f["mimeType"].startswith("image/"):
+            continue
+
+        # Skip pixels already collected in this sync (any patient)
+        checksum = f.get("md5Checksum") or f["id"]
+        if seen is not None:
+            if checksum in seen:
+                continue
+            seen.add(checksum)
+
+        # Determine stage
+        match = STAGE_REGEX.search(f["name"])
+        if match:
+            stage = match.group(1).lower()
+        else:
+            folder_match = STAGE_REGEX.search(folder_name.lower())
+            stage = folder_match.group(1).lower() if folder_match else "mid"
+
+        image_url = f"https://lh3.googleusercontent.com/d/{f['id']}"
+
+        collected.append(
+            PatientImage(
+                patient=patient,
+                stage=stage,
+                image_url=image_url,
+                checksum=checksum
+            )
+        )
+
+
+# ================================
+# Sync Entry Point
+# ================================
+def sync_drive(project, patient_ids=None):
+    """
+    Sync every patient folder under the project's Drive root, or only
+    those named in `patient_ids`.
+    """
+
+    SERVICE_ACCOUNT_FILE = os.path.join(
+        settings.BASE_DIR,
+        "service-account.json"
+    )
+
+    service = build_drive_service(SERVICE_ACCOUNT_FILE)
+
+    results = service.files().list(
+        q=f"'{project.drive_folder_id}' in parents and mimeType='{FOLDER_MIME}'",
+        fields="files(id, name)"
+    ).execute()
+
+    folders = results.get("files", [])
+
+    if patient_ids is not None:
+        wanted = {p.strip().upper() for p in patient_ids}
+        folders = [f for f in folders if f["name"].strip().upper() in wanted]
+
+    folders.sort(
+        key=lambda x: [
+            int(t) if t.isdigit() else t
+            for t in re.split(r"(\d+)", x["name"])
+        ]
+    )
+
+    # Checksums already collected during this sync, so copied
+    # folders do not serve the same image under two patients.
+    seen = set()
+    if patient_ids is not None:
+        # Partial sync: images kept by the project's other patients still count
+        seen.update(
+            PatientImage.objects
+            .filter(patient__project=project)
+            .exclude(patient__patient_id__in=wanted)
+            .exclude(checksum="")
+            .values_list("checksum", flat=True)
+        )
+
+    for folder in folders:
+        patient_id = folder["name"].strip().upper()
+        patient, _ = Patient.objects.get_or_create(
+            project=project,
+            patient_id=patient_id
+        )
+
+        collected = []
+        fetch_images_recursive(
+            service,
+            folder["id"],
+            patient,
+            collected,
+            folder_name=folder["name"],
+            seen=seen
+        )
+
+        with transaction.atomic():
+            PatientImage.objects.filter(
+                patient=patient
+            ).delete()
+            PatientImage.objects.bulk_create(collected)
+
+        print(
+            f"[SYNC] {patient_id}: {len(collected)} images"
+        )
+
+    Project.objects.filter(pk=project.pk).update(last_synced_at=timezone.now())
+
+
+def due_projects(now=None):
+    """Projects with a sync schedule whose interval has elapsed."""
+    now = now or timezone.now()
+    due = []
+    for project in Project.objects.filter(sync_interval__isnull=False):
+        last = project.last_synced_at
+        if last is None or now - last >= timedelta(minutes=project.sync_interval):
+            due.append(project)
+    return due
@@ -0,0 +1,109 @@
+# annotations/history.py
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .models import Annotation, AnnotationChange, AnnotationCheckpoint
+
+
+# Changes younger than this may belong to transactions that have not
+# committed yet, so checkpoints leave them for replay.
+SETTLE = timedelta(minutes=1)
+
+
+def latest_checkpoint(when):
+    return (
+        AnnotationCheckpoint.objects
+        .filter(created_at__lte=when)
+        .order_by("-created_at", "-id")
+        .first()
+    )
+
+
+def apply_delta(state, annotation_id, delta):
+    if delta == AnnotationChange.TOMBSTONE:
+        state.pop(annotation_id, None)
+    else:
+        state.setdefault(annotation_id, {}).update(delta)
+
+
+def annotations_as_of(when, annotation_ids=None):
+    """
+    Rebuild annotation state as it was at `when`.
+
+    Starts from the latest checkpoint at or before `when` and replays the
+    deltas recorded after it. Returns {annotation_id: {field: value}}.
+    """
+    checkpoint = latest_checkpoint(when)
+
+    changes = AnnotationChange.objects.filter(changed_at__lte=when)
+    state = {}
+
+    if checkpoint:
+        state = {int(k): v for k, v in checkpoint.state.items()}
+        # Replay by id, not time: a save in flight while the checkpoint was
+        # taken can carry a changed_at older than the checkpoint itself.
+        changes = changes.filter(id__gt=checkpoint.last_change_id)
+
+    if annotation_ids is not None:
+        ids = set(annotation_ids)
+        state = {k: v for k, v in state.items() if k in ids}
+        changes = changes.filter(annotation_id__in=ids)
+
+    rows = changes.order_by("id").values_list("annotation_id", "delta")
+    for annotation_id, delta in rows.iterator():
+        apply_delta(state, annotation_id, delta)
+
+    return state
+
+
+def create_checkpoint(now=None, settle=SETTLE):
+    """
+    Fold every settled change into a new checkpoint.
+
+    Only changes recorded more than `settle` ago are included; anything
+    newer is replayed from AnnotationChange after the checkpoint.
+    """
+    now = now or timezone.now()
+    cutoff = now - settle
+
+    with transaction.atomic():
+        previous = latest_checkpoint(cutoff)
+        start_id = previous.last_change_id if previous else 0
+
+        settled = AnnotationChange.objects.filter(
+            id__gt=start_id, changed_at__lte=cutoff
+        )
+        last_id = settled.aggregate(m=Max("id"))["m"] or start_id
+
+        state = {}
+        if previous:
+            state = {int(k): v for k, v in previous.state.items()}
+
+        changes = (
+            AnnotationChange.objects
+            .filter(id__gt=start_id, id__lte=last_id)
+            .order_by("id")
+        )
+        created_at = cutoff
+        for change in changes.iterator():
+            apply_delta(state, change.annotation_id, change.delta)
+            created_at = max(created_at, change.changed_at)
+
+        # Annotations saved before history was recorded have no deltas
+        legacy = (
+            Annotation.objects
+            .filter(~Exists(AnnotationChange.objects.filter(annotation_id=OuterRef("pk"))))
+            .exclude(id__in=state.keys())
+            .values("id", *Annotation.TRACKED_FIELDS)
+        )
+        for row in legacy.iterator():
+            state[row.pop("id")] = row
+
+        return AnnotationCheckpoint.objects.create(
+            created_at=created_at,
+            last_change_id=last_id,
+            state={str(k): v for k, v in state.items()}
+        )
@@ -0,0 +1,54 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+
+from annotations.models import CaseTiming
+from annotations.telemetry import rollup_events
+
+
+def percentile(sorted_values, q):
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Roll reader telemetry into CaseTiming and print timing distributions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--by", choices=["user", "patient"], default=None,
+            help="Also print time-on-case distribution per reader or per case."
+        )
+
+    def handle(self, *args, **options):
+        updated = rollup_events()
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} case timing(s)."))
+
+        by = options["by"]
+        if not by:
+            return
+
+        if by == "user":
+            name = F("user__username")
+        else:
+            # Patient ids repeat across projects
+            name = Concat("patient__project__slug", Value("/"), "patient__patient_id")
+        rows = (
+            CaseTiming.objects
+            .filter(submitted_at__isnull=False)
+            .annotate(name=name)
+            .order_by("name", "active_seconds")
+            .values_list("name", "active_seconds")
+        )
+
+        self.stdout.write(f"{by:<20} {'n':>5} {'p10':>8} {'p50':>8} {'p90':>8}  (seconds)")
+        for name, group in groupby(rows.iterator(), key=lambda r: r[0]):
+            values = [seconds for _, seconds in group]
+            self.stdout.write(
+                f"{name:<20} {len(values):>5} "
+                f"{percentile(values, 0.1):>8.0f} "
+                f"{percentile(values, 0.5):>8.0f} "
+                f"{percentile(values, 0.9):>8.0f}"
+            )
@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from annotations.cohorts import compile_spec, materialize
+from annotations.models import Cohort, Project
+
+
+class Command(BaseCommand):
+    help = "Create or refresh a named cohort and materialize its member list."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?", help="Cohort name (slug).")
+        parser.add_argument(
+            "--spec",
+            help='Filter spec as JSON, e.g. \'{"stages_only": ["late"]}\'.'
+        )
+        parser.add_argument(
+            "--project",
+            help="Project slug (required when creating a cohort)."
+        )
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Re-materialize every stored cohort."
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            targets = list(Cohort.objects.order_by("name"))
+        elif options["name"]:
+            spec = None
+            if options["spec"]:
+                try:
+                    spec = json.loads(options["spec"])
+                    compile_spec(spec)
+                except ValueError as e:
+                    raise CommandError(f"Invalid --spec: {e}")
+
+            project = None
+            if options["project"]:
+                project = Project.objects.filter(slug=options["project"]).first()
+                if project is None:
+                    raise CommandError(f"Unknown project: {options['project']}")
+
+            cohort = Cohort.objects.filter(name=options["name"]).first()
+            if cohort is None:
+                if project is None:
+                    raise CommandError("--project is required for a new cohort.")
+                cohort = Cohort.objects.create(
+                    name=options["name"], project=project, spec=spec or {}
+                )
+            else:
+                if spec is not None:
+                    cohort.spec = spec
+                if project is not None:
+                    cohort.project = project
+                cohort.save(update_fields=["spec", "project"])
+            targets = [cohort]
+        else:
+            raise CommandError("Give a cohort name or --all.")
+
+        for cohort in targets:
+            try:
+                size = materialize(cohort)
+            except ValueError as e:
+                self.stderr.write(f"{cohort.name}: {e}")
+                continue
+            self.stdout.write(self.style.SUCCESS(f"{cohort.name}: {size} patient(s)"))
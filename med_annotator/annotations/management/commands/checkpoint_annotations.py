@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from annotations.history import create_checkpoint
+
+
+class Command(BaseCommand):
+    help = "Snapshot annotation state so history lookups replay fewer deltas."
+
+    def handle(self, *args, **options):
+        checkpoint = create_checkpoint()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checkpoint {checkpoint.id} at {checkpoint.created_at:%Y-%m-%d %H:%M:%S} "
+                f"({len(checkpoint.state)} annotations)"
+            )
+        )
@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db.models import Case, Count, F, Value, When
+from django.db.models.functions import Concat
+
+from annotations.models import PatientImage
+
+
+class Command(BaseCommand):
+    help = (
+        "List images whose checksum appears under more than one patient. "
+        "Rows still keyed by Drive file id (backfilled before md5 checksums "
+        "were stored) only match exact same-file copies; a full sync of "
+        "their project re-keys them."
+    )
+
+    def handle(self, *args, **options):
+        # Images without a checksum are compared by URL instead
+        images = PatientImage.objects.annotate(
+            key=Case(
+                When(checksum="", then=F("image_url")),
+                default=F("checksum"),
+            )
+        )
+
+        # Keys shared by two or more distinct patients
+        dup_keys = (
+            images
+            .order_by()
+            .values("key")
+            .annotate(n=Count("patient", distinct=True))
+            .filter(n__gt=1)
+            .values_list("key", flat=True)
+        )
+
+        groups = defaultdict(list)
+        rows = (
+            images
+            .filter(key__in=dup_keys)
+            .order_by("key", "patient__project__slug", "patient__patient_id")
+            .values_list(
+                "key", "patient__project__slug", "patient__patient_id",
+                "stage", "image_url"
+            )
+        )
+        for key, slug, patient_id, stage, image_url in rows:
+            groups[key].append((f"{slug}/{patient_id}", stage, image_url))
+
+        if not groups:
+            self.stdout.write(self.style.SUCCESS("No cross-patient duplicates."))
+        else:
+            for checksum, images in groups.items():
+                self.stdout.write(f"{checksum}:")
+                for patient_id, stage, image_url in images:
+                    self.stdout.write(f"  {patient_id} ({stage}) {image_url}")
+
+            self.stdout.write(
+                self.style.WARNING(f"{len(groups)} duplicated image(s) found.")
+            )
+
+        self.report_file_id_checksums()
+
+    def report_file_id_checksums(self):
+        # A copy of a file has a new id, so these rows never match
+        # an md5-keyed row until a full sync replaces them
+        by_project = (
+            PatientImage.objects
+            .exclude(checksum="")
+            .filter(image_url__endswith=Concat(Value("/d/"), F("checksum")))
+            .order_by("patient__project__slug")
+            .values_list("patient__project__slug")
+            .annotate(n=Count("id"))
+        )
+        for slug, n in by_project:
+            self.stdout.write(self.style.WARNING(
+                f"{slug}: {n} image(s) keyed by Drive file id, not md5; "
+                f"copies of them are not detected. Run "
+                f"`manage.py sync_projects --project {slug}` to re-key them."
+            ))
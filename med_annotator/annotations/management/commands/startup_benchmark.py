@@ -0,0 +1,104 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from annotations.drive_sync import HEAVY_MODULES
+
+
+# Runs in a fresh interpreter so nothing is already imported or cached.
+PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+import django
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "med_annotator.settings")
+django.setup()
+t1 = time.perf_counter()
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import Client
+from annotations.models import Patient, Project
+from annotations.views import queue_url
+
+# Seed a reader and a case, then roll everything back so the benchmark
+# leaves the database as it found it
+with transaction.atomic():
+    project = Project.objects.create(
+        slug="startup-benchmark", name="Startup benchmark", drive_folder_id="-"
+    )
+    patient = Patient.objects.create(patient_id="startup-benchmark", project=project)
+    user = get_user_model().objects.create(username="startup-benchmark")
+    client = Client(HTTP_HOST="localhost")
+    client.force_login(user)
+
+    t2 = time.perf_counter()
+    status = client.get(queue_url(patient.patient_id, project)).status_code
+    t3 = time.perf_counter()
+    transaction.set_rollback(True)
+
+heavy = sorted(
+    m for m in sys.modules
+    if any(m == h or m.startswith(h + ".") for h in json.loads(sys.argv[1]))
+)
+print(json.dumps({
+    "setup_ms": (t1 - t0) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "status": status,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def run_probe():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, json.dumps(HEAVY_MODULES)],
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = "Measure cold django.setup() and first-request time in a fresh process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--budget-ms", type=float, default=None,
+            help="Fail if median setup + first request exceeds this."
+        )
+
+    def handle(self, *args, **options):
+        runs = [run_probe() for _ in range(options["runs"])]
+
+        statuses = sorted({r["status"] for r in runs} - {200})
+        if statuses:
+            raise CommandError(
+                "First request did not render the annotation page: HTTP "
+                + ", ".join(str(s) for s in statuses)
+            )
+
+        setup = sorted(r["setup_ms"] for r in runs)
+        first = sorted(r["first_request_ms"] for r in runs)
+        mid = len(runs) // 2
+
+        self.stdout.write(f"django.setup():  median {setup[mid]:.1f} ms  (min {setup[0]:.1f})")
+        self.stdout.write(f"first request:   median {first[mid]:.1f} ms  (min {first[0]:.1f})")
+
+        heavy = sorted({m for r in runs for m in r["heavy_modules"]})
+        if heavy:
+            raise CommandError(
+                "Heavy modules imported on the request path: " + ", ".join(heavy)
+            )
+
+        budget = options["budget_ms"]
+        total = setup[mid] + first[mid]
+        if budget is not None and total > budget:
+            raise CommandError(f"Startup took {total:.1f} ms, budget is {budget:.1f} ms")
+
+        self.stdout.write(self.style.SUCCESS(f"Total {total:.1f} ms"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from annotations.drive_sync import due_projects, sync_drive
+from annotations.models import Project
+
+
+class Command(BaseCommand):
+    help = "Sync projects whose Drive sync schedule is due (run from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project", action="append", dest="projects", default=[],
+            help="Sync this project slug now, regardless of schedule."
+        )
+
+    def handle(self, *args, **options):
+        if options["projects"]:
+            projects = list(Project.objects.filter(slug__in=options["projects"]))
+            missing = set(options["projects"]) - {p.slug for p in projects}
+            if missing:
+                raise CommandError(f"Unknown project(s): {', '.join(sorted(missing))}")
+        else:
+            projects = due_projects()
+
+        for project in projects:
+            try:
+                sync_drive(project)
+            except Exception as e:
+                self.stderr.write(f"{project.slug}: sync failed: {e}")
+                continue
+            self.stdout.write(self.style.SUCCESS(f"{project.slug}: synced"))
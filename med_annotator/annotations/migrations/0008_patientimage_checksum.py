@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0007_casecomment_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientimage',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
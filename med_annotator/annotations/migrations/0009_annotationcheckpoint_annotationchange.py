@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0008_patientimage_checksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnotationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('state', models.JSONField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnnotationChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(db_index=True)),
+                ('delta', models.JSONField()),
+                ('annotation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='annotations.annotation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['annotation', 'changed_at'], name='annotations_annotat_50e565_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0009_annotationcheckpoint_annotationchange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnotationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('open', 'Open'), ('zoom', 'Image zoom'), ('save', 'Save'), ('submit', 'Submit')], max_length=10)),
+                ('occurred_at', models.DateTimeField()),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='annotations.patient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'patient', 'occurred_at'], name='annotations_user_id_c66316_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CaseTiming',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('opened_at', models.DateTimeField(null=True)),
+                ('submitted_at', models.DateTimeField(null=True)),
+                ('active_seconds', models.FloatField(default=0)),
+                ('zoom_count', models.IntegerField(default=0)),
+                ('save_count', models.IntegerField(default=0)),
+                ('last_event_id', models.BigIntegerField(db_index=True, default=0)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='annotations.patient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'active_seconds'], name='annotations_patient_83cb22_idx'), models.Index(fields=['user', 'active_seconds'], name='annotations_user_id_5eaee3_idx')],
+                'unique_together': {('user', 'patient')},
+            },
+        ),
+    ]
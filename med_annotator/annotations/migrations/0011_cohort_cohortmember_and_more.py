@@ -0,0 +1,59 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0010_annotationevent_casetiming'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cohort',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(max_length=100, unique=True)),
+                ('spec', models.JSONField(default=dict)),
+                ('materialized_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CohortMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='annotation',
+            index=models.Index(fields=['patient', 'quality'], name='annotations_patient_d9efd9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientimage',
+            index=models.Index(fields=['patient', 'stage'], name='annotations_patient_cd3412_idx'),
+        ),
+        migrations.AddField(
+            model_name='cohort',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='cohortmember',
+            name='cohort',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='annotations.cohort'),
+        ),
+        migrations.AddField(
+            model_name='cohortmember',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='annotations.patient'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cohortmember',
+            unique_together={('cohort', 'patient'), ('cohort', 'position')},
+        ),
+    ]
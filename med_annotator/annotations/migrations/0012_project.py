@@ -0,0 +1,67 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The Drive root that used to be hard-coded in views.py
+LEGACY_FOLDER_ID = "1_vDh3Oizwndg_9Q7D8yJPjERswzZwocu"
+
+
+def create_default_project(apps, schema_editor):
+    Project = apps.get_model('annotations', 'Project')
+    Patient = apps.get_model('annotations', 'Patient')
+    Cohort = apps.get_model('annotations', 'Cohort')
+
+    project, _ = Project.objects.get_or_create(
+        slug='default',
+        defaults={'name': 'Default', 'drive_folder_id': LEGACY_FOLDER_ID},
+    )
+    Patient.objects.filter(project__isnull=True).update(project=project)
+    Cohort.objects.filter(project__isnull=True).update(project=project)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0011_cohort_cohortmember_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Project',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('drive_folder_id', models.CharField(max_length=100)),
+                ('sync_interval', models.PositiveIntegerField(blank=True, null=True)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cohort',
+            name='project',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cohorts', to='annotations.project'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='project',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='patients', to='annotations.project'),
+        ),
+        migrations.RunPython(create_default_project, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cohort',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cohorts', to='annotations.project'),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='patients', to='annotations.project'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['project', 'patient_id'], name='annotations_project_e8c387_idx'),
+        ),
+    ]
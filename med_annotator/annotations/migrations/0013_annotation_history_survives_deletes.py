@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0012_project'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotationcheckpoint',
+            name='last_change_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='annotationchange',
+            name='annotation',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='changes', to='annotations.annotation'),
+        ),
+    ]
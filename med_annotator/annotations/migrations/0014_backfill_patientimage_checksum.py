@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:59
+
+import re
+
+from django.db import migrations
+
+
+# Image URLs written by the Drive sync end in the Drive file id
+DRIVE_ID = re.compile(r"/d/([\w-]+)$")
+
+
+def backfill_checksums(apps, schema_editor):
+    """Give pre-checksum rows the same file-id fallback the sync uses."""
+    PatientImage = apps.get_model('annotations', 'PatientImage')
+
+    batch = []
+    for image in PatientImage.objects.filter(checksum='').only('id', 'image_url').iterator():
+        match = DRIVE_ID.search(image.image_url)
+        if match:
+            image.checksum = match.group(1)
+            batch.append(image)
+        if len(batch) >= 1000:
+            PatientImage.objects.bulk_update(batch, ['checksum'])
+            batch = []
+    PatientImage.objects.bulk_update(batch, ['checksum'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0013_annotation_history_survives_deletes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_checksums, migrations.RunPython.noop),
+    ]
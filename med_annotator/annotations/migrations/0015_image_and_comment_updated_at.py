@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0014_backfill_patientimage_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casecomment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='patientimage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0015_image_and_comment_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotationevent',
+            name='processed',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
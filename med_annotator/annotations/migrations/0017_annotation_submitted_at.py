@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:13
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def backfill_submitted(apps, schema_editor):
+    """
+    Existing rows cannot say whether they were submitted. Treat any row
+    with an answer as submitted; blank rows were only opened and go back
+    into their reader's queue.
+    """
+    Annotation = apps.get_model('annotations', 'Annotation')
+    Annotation.objects.filter(
+        Q(vasculitis_present=True)
+        | (Q(activity__isnull=False) & ~Q(activity=''))
+        | Q(quality__isnull=False)
+        | (Q(comment__isnull=False) & ~Q(comment=''))
+    ).update(submitted_at=F('annotated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotations', '0016_annotationevent_processed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_submitted, migrations.RunPython.noop),
+    ]
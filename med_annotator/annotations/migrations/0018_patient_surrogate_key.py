@@ -0,0 +1,202 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Models with a foreign key to Patient, and that key's related_name
+PATIENT_REFS = {
+    'patientimage': 'images',
+    'annotation': 'annotations',
+    'casecomment': None,
+    'annotationevent': None,
+    'casetiming': None,
+    'cohortmember': None,
+}
+
+
+def number_patients(apps, schema_editor):
+    """
+    Give every patient its new integer id, point the referencing rows at
+    it, and rewrite the patient ids stored in annotation history.
+    """
+    Patient = apps.get_model('annotations', 'Patient')
+    AnnotationChange = apps.get_model('annotations', 'AnnotationChange')
+    AnnotationCheckpoint = apps.get_model('annotations', 'AnnotationCheckpoint')
+
+    old_keys = Patient.objects.order_by('created_at', 'patient_id').values_list('pk', flat=True)
+    new_ids = {}
+    for number, key in enumerate(old_keys, start=1):
+        Patient.objects.filter(pk=key).update(id=number)
+        new_ids[key] = number
+
+    for model_name in PATIENT_REFS:
+        model = apps.get_model('annotations', model_name)
+        model.objects.update(
+            patient_ref=Subquery(
+                Patient.objects.filter(pk=OuterRef('patient')).values('id')[:1]
+            )
+        )
+
+    # Deltas and checkpoints carry Annotation.patient_id; keep them
+    # comparable with what new saves record
+    batch = []
+    for change in AnnotationChange.objects.filter(delta__has_key='patient_id').iterator():
+        key = change.delta['patient_id']
+        if key in new_ids:
+            change.delta['patient_id'] = new_ids[key]
+            batch.append(change)
+        if len(batch) >= 1000:
+            AnnotationChange.objects.bulk_update(batch, ['delta'])
+            batch = []
+    AnnotationChange.objects.bulk_update(batch, ['delta'])
+
+    for checkpoint in AnnotationCheckpoint.objects.iterator():
+        for row in checkpoint.state.values():
+            if row.get('patient_id') in new_ids:
+                row['patient_id'] = new_ids[row['patient_id']]
+        checkpoint.save(update_fields=['state'])
+
+
+def patient_fk(related_name):
+    return models.ForeignKey(
+        on_delete=django.db.models.deletion.CASCADE,
+        related_name=related_name,
+        to='annotations.patient',
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Patient.patient_id was the primary key, so two projects could not
+    both have a patient folder called e.g. "C1". Patients get an integer
+    id instead, and patient_id is unique per project.
+
+    Every table pointing at Patient is re-keyed through a temporary
+    patient_ref column, because the old foreign keys hold patient_id
+    strings.
+    """
+
+    dependencies = [
+        ('annotations', '0017_annotation_submitted_at'),
+    ]
+
+    operations = [
+        # 1. New integer keys alongside the old ones
+        migrations.AddField(
+            model_name='patient',
+            name='id',
+            field=models.BigIntegerField(null=True),
+        ),
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='patient_ref',
+                field=models.BigIntegerField(null=True),
+            )
+            for model_name in PATIENT_REFS
+        ],
+        # Irreversible: once projects share a patient_id it cannot be a key again
+        migrations.RunPython(number_patients),
+
+        # 2. Drop the old string foreign keys and everything built on them
+        migrations.RemoveIndex(
+            model_name='patientimage',
+            name='annotations_patient_cd3412_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='annotation',
+            name='annotations_patient_d9efd9_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='annotation',
+            unique_together=set(),
+        ),
+        migrations.RemoveIndex(
+            model_name='annotationevent',
+            name='annotations_user_id_c66316_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='casetiming',
+            name='annotations_patient_83cb22_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='casetiming',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cohortmember',
+            unique_together={('cohort', 'position')},
+        ),
+        *[
+            migrations.RemoveField(model_name=model_name, name='patient')
+            for model_name in PATIENT_REFS
+        ],
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='annotations_project_e8c387_idx',
+        ),
+
+        # 3. Swap the primary key
+        migrations.AlterField(
+            model_name='patient',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='patient_id',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='patient',
+            unique_together={('project', 'patient_id')},
+        ),
+
+        # 4. Turn the new keys into foreign keys and restore constraints
+        *[
+            operation
+            for model_name, related_name in PATIENT_REFS.items()
+            for operation in (
+                migrations.AlterField(
+                    model_name=model_name,
+                    name='patient_ref',
+                    field=patient_fk(related_name),
+                ),
+                migrations.RenameField(
+                    model_name=model_name,
+                    old_name='patient_ref',
+                    new_name='patient',
+                ),
+            )
+        ],
+        migrations.AddIndex(
+            model_name='patientimage',
+            index=models.Index(fields=['patient', 'stage'], name='annotations_patient_cd3412_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='annotation',
+            index=models.Index(fields=['patient', 'quality'], name='annotations_patient_d9efd9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='annotation',
+            unique_together={('user', 'patient')},
+        ),
+        migrations.AddIndex(
+            model_name='annotationevent',
+            index=models.Index(fields=['user', 'patient', 'occurred_at'], name='annotations_user_id_c66316_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='casetiming',
+            index=models.Index(fields=['patient', 'active_seconds'], name='annotations_patient_83cb22_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='casetiming',
+            unique_together={('user', 'patient')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='cohortmember',
+            unique_together={('cohort', 'patient'), ('cohort', 'position')},
+        ),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings 
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
 ACTIVITY_CHOICES = [
     ('active', 'Active'),
@@ -8,10 +11,28 @@ ACTIVITY_CHOICES = [
     ('unknown', 'Unknown'),
 ]
 
+class Project(models.Model):
+    """One study: its own Drive root, patients and sync schedule."""
+    slug = models.SlugField(max_length=50, unique=True)
+    name = models.CharField(max_length=200)
+    drive_folder_id = models.CharField(max_length=100)
+    # Minutes between scheduled syncs; empty means manual sync only
+    sync_interval = models.PositiveIntegerField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Patient(models.Model):
-    patient_id = models.CharField(max_length=50, unique=True, primary_key=True)
+    # The Drive folder name; only unique within a project
+    patient_id = models.CharField(max_length=50)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='patients')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        unique_together = ('project', 'patient_id')
+
     def __str__(self):
         return self.patient_id
 
@@ -25,12 +46,18 @@ class PatientImage(models.Model):
     ]
     stage = models.CharField(max_length=10, choices=STAGE_CHOICES)
     image_url = models.URLField(max_length=500)
-    
+    # Drive's md5Checksum (falls back to the Drive file id for files
+    # Drive does not checksum). Used to skip duplicate pixels on sync.
+    checksum = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     # --- CRITICAL FIX: REMOVED unique_together ---
     # This allows multiple 'late' images for a single patient (e.g., C108)
     class Meta:
         # unique_together = ('patient', 'stage')  <-- REMOVE THIS LINE
-        pass
+        indexes = [
+            models.Index(fields=['patient', 'stage']),
+        ]
 
     def __str__(self):
         return f"{self.patient.patient_id} - {self.stage}"
@@ -59,12 +86,105 @@ class Annotation(models.Model):
         help_text="Image quality on a scale of 1 (Poor) to 10 (Good)"
     )
     annotated_at = models.DateTimeField(auto_now=True)
+    # Set by "Submit & Next". Opening a case creates a blank row and
+    # annotated_at moves on every save, so neither marks a finished read.
+    submitted_at = models.DateTimeField(null=True, blank=True)
+
+    # Fields recorded in AnnotationChange deltas
+    TRACKED_FIELDS = (
+        'user_id', 'patient_id', 'vasculitis_present',
+        'activity', 'quality', 'comment',
+    )
 
     class Meta:
         unique_together = ('user', 'patient')
+        indexes = [
+            models.Index(fields=['patient', 'quality']),
+        ]
 
     def __str__(self):
         return f"Annotation for {self.patient.patient_id} by {self.user.username}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember loaded values so save() only records what changed
+        instance._tracked = instance.tracked_state()
+        return instance
+
+    def tracked_state(self):
+        loaded = self.__dict__
+        return {f: loaded[f] for f in self.TRACKED_FIELDS if f in loaded}
+
+    def save(self, *args, **kwargs):
+        previous = getattr(self, '_tracked', {})
+        current = self.tracked_state()
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # Only the listed fields reach the database
+            saved = {self._meta.get_field(name).attname for name in update_fields}
+            current = {f: v for f, v in current.items() if f in saved}
+
+        delta = {
+            f: value for f, value in current.items()
+            if f not in previous or previous[f] != value
+        }
+
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            if delta:
+                # auto_now only refreshes annotated_at when it is saved
+                stamped = update_fields is None or 'annotated_at' in update_fields
+                AnnotationChange.objects.using(self._state.db).create(
+                    annotation=self,
+                    changed_at=self.annotated_at if stamped else timezone.now(),
+                    delta=delta
+                )
+
+        self._tracked = {**previous, **current}
+
+
+class AnnotationChange(models.Model):
+    """
+    Append-only field-level delta for one Annotation save. Rows outlive
+    the annotation they describe, so there is no database constraint.
+    """
+    annotation = models.ForeignKey(
+        Annotation,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='changes'
+    )
+    changed_at = models.DateTimeField(db_index=True)
+    delta = models.JSONField()
+
+    # Delta written when the annotation is deleted; replay drops the row
+    TOMBSTONE = {'_deleted': True}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['annotation', 'changed_at']),
+        ]
+
+
+@receiver(post_delete, sender=Annotation)
+def record_annotation_delete(sender, instance, using, **kwargs):
+    # A receiver rather than Annotation.delete() so cascades from
+    # Patient, User and Project deletes are recorded too
+    AnnotationChange.objects.using(using).create(
+        annotation_id=instance.pk,
+        changed_at=timezone.now(),
+        delta=AnnotationChange.TOMBSTONE
+    )
+
+
+class AnnotationCheckpoint(models.Model):
+    """Full annotation state at a point in time, keyed by annotation id."""
+    created_at = models.DateTimeField(db_index=True)
+    # Highest AnnotationChange.id folded into `state`; replay resumes after it
+    last_change_id = models.BigIntegerField(default=0)
+    state = models.JSONField()
     
 # models.py
 class CaseComment(models.Model):
@@ -72,3 +192,67 @@ class CaseComment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class AnnotationEvent(models.Model):
+    """Raw reader telemetry posted in batches from the annotation page."""
+    KIND_CHOICES = [
+        ('open', 'Open'),
+        ('zoom', 'Image zoom'),
+        ('save', 'Save'),
+        ('submit', 'Submit'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    occurred_at = models.DateTimeField()
+    # Set once the event has been folded into CaseTiming
+    processed = models.BooleanField(default=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'patient', 'occurred_at']),
+        ]
+
+
+class CaseTiming(models.Model):
+    """Time-on-case per reader, rolled up from AnnotationEvent."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    opened_at = models.DateTimeField(null=True)
+    submitted_at = models.DateTimeField(null=True)
+    active_seconds = models.FloatField(default=0)
+    zoom_count = models.IntegerField(default=0)
+    save_count = models.IntegerField(default=0)
+    last_event_id = models.BigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'patient')
+        indexes = [
+            models.Index(fields=['patient', 'active_seconds']),
+            models.Index(fields=['user', 'active_seconds']),
+        ]
+
+
+class Cohort(models.Model):
+    """A named patient filter, materialized into an ordered member list."""
+    name = models.SlugField(max_length=100, unique=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='cohorts')
+    spec = models.JSONField(default=dict)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    materialized_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class CohortMember(models.Model):
+    cohort = models.ForeignKey(Cohort, on_delete=models.CASCADE, related_name='members')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [('cohort', 'position'), ('cohort', 'patient')]
@@ -0,0 +1,74 @@
+// annotations/static/js/annotation_page.js
+
+document.addEventListener('DOMContentLoaded', () => {
+    const slider = document.getElementById('id_quality');
+    const display = document.getElementById('val-display');
+    if (slider) {
+        slider.addEventListener('input', e => {
+            display.innerText = e.target.value;
+        });
+    }
+});
+
+// --- Reader telemetry ---
+// Events are queued in memory and posted in batches; the final batch is
+// sent with sendBeacon when the page is hidden or navigated away from.
+(() => {
+    const wrapper = document.querySelector('.clinical-wrapper');
+    if (!wrapper || !wrapper.dataset.telemetryUrl) return;
+
+    const url = wrapper.dataset.telemetryUrl;
+    const patientId = wrapper.dataset.patientId;
+    const project = wrapper.dataset.project;
+    const FLUSH_MS = 15000;
+    const MAX_QUEUE = 50;
+    let queue = [];
+
+    function csrfToken() {
+        const input = document.querySelector('input[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function record(kind) {
+        queue.push({ kind: kind, project: project, patient_id: patientId, ts: Date.now() });
+        if (queue.length >= MAX_QUEUE) flush(false);
+    }
+
+    function flush(final) {
+        if (!queue.length) return;
+        const body = new FormData();
+        body.append('csrfmiddlewaretoken', csrfToken());
+        body.append('events', JSON.stringify(queue));
+        queue = [];
+
+        if (final && navigator.sendBeacon) {
+            navigator.sendBeacon(url, body);
+        } else {
+            fetch(url, { method: 'POST', body: body, credentials: 'same-origin', keepalive: true })
+                .catch(() => {});
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        record('open');
+
+        document.querySelectorAll('.img-wrapper').forEach(el => {
+            el.addEventListener('mouseenter', () => record('zoom'));
+        });
+
+        const form = document.querySelector('.clinical-card form');
+        if (form) {
+            form.addEventListener('submit', e => {
+                const action = e.submitter ? e.submitter.value : 'save';
+                record(action === 'save_and_next' ? 'submit' : 'save');
+                flush(true);
+            });
+        }
+    });
+
+    setInterval(() => flush(false), FLUSH_MS);
+    window.addEventListener('pagehide', () => flush(true));
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flush(true);
+    });
+})();
@@ -0,0 +1,14 @@
+// annotations/static/js/auth.js
+
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('googleSignInForm');
+    if (!form) return;
+
+    // Show spinner on submit
+    form.addEventListener('submit', () => {
+        const btn = document.getElementById('signInBtn');
+        btn.setAttribute('disabled', 'disabled');
+        btn.querySelector('.flex-grow-1').textContent = 'Authenticating...';
+        document.getElementById('loadingSpinner').classList.remove('d-none');
+    });
+});
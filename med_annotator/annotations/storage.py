@@ -0,0 +1,17 @@
+# annotations/storage.py
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    """
+    Hashed, precompressed static files written by collectstatic.
+
+    Until collectstatic has produced a manifest (fresh checkouts, tests)
+    unhashed names are served instead of raising "Missing staticfiles
+    manifest entry" on every {% static %} tag.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -0,0 +1,163 @@
+# annotations/telemetry.py
+"""
+Reader telemetry: batch ingestion of page events and the roll-up into
+per-reader, per-case timings.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import attrgetter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AnnotationEvent, CaseTiming, Patient
+
+
+MAX_BATCH = 200
+
+# Gaps longer than this (tab left open, coffee break) count as idle
+IDLE_CAP = timedelta(minutes=5)
+
+EVENT_KINDS = {kind for kind, _ in AnnotationEvent.KIND_CHOICES}
+
+
+def ingest_events(user, events):
+    """
+    Store one client batch with a single bulk insert.
+
+    Each event is {"kind": ..., "project": <slug>, "patient_id": ...,
+    "ts": <epoch ms>}. Malformed events and unknown patients are
+    dropped. Returns the number of events stored.
+    """
+    now = timezone.now()
+    parsed = []
+
+    for event in events[:MAX_BATCH]:
+        if not isinstance(event, dict) or event.get("kind") not in EVENT_KINDS:
+            continue
+        try:
+            occurred_at = datetime.fromtimestamp(
+                float(event["ts"]) / 1000, tz=dt_timezone.utc
+            )
+            # Patient ids are only unique within a project
+            case = (str(event["project"]), str(event["patient_id"]))
+        except (KeyError, TypeError, ValueError, OverflowError, OSError):
+            continue
+        # Client clocks drift; never accept events from the future
+        parsed.append((event["kind"], case, min(occurred_at, now)))
+
+    known = {
+        (slug, patient_id): pk
+        for pk, slug, patient_id in Patient.objects.filter(
+            project__slug__in={slug for _, (slug, _), _ in parsed},
+            patient_id__in={p for _, (_, p), _ in parsed},
+        ).values_list("pk", "project__slug", "patient_id")
+    }
+
+    rows = [
+        AnnotationEvent(
+            user=user,
+            patient_id=known[case],
+            kind=kind,
+            occurred_at=occurred_at
+        )
+        for kind, case, occurred_at in parsed
+        if case in known
+    ]
+    AnnotationEvent.objects.bulk_create(rows)
+    return len(rows)
+
+
+def summarize(events):
+    """Fold one reader's ordered events for one case into timing fields."""
+    active = timedelta()
+    opened_at = submitted_at = None
+    zooms = saves = 0
+    previous = None
+
+    for event in events:
+        if event.kind == "open" and opened_at is None:
+            opened_at = event.occurred_at
+        elif event.kind == "zoom":
+            zooms += 1
+        elif event.kind == "save":
+            saves += 1
+        elif event.kind == "submit":
+            submitted_at = event.occurred_at
+
+        if previous is not None:
+            active += min(event.occurred_at - previous, IDLE_CAP)
+        previous = event.occurred_at
+
+    return {
+        "opened_at": opened_at,
+        "submitted_at": submitted_at,
+        "active_seconds": active.total_seconds(),
+        "zoom_count": zooms,
+        "save_count": saves,
+    }
+
+
+def rollup_events():
+    """
+    Recompute CaseTiming for every (reader, case) pair that has
+    unprocessed events. Returns the number of pairs updated.
+
+    Events are marked processed rather than tracked by an id watermark,
+    so a batch that commits after a later-numbered one is never skipped.
+    """
+    pending = list(
+        AnnotationEvent.objects
+        .filter(processed=False)
+        .values_list("id", "user_id", "patient_id")
+    )
+    if not pending:
+        return 0
+
+    pending_ids = [event_id for event_id, _, _ in pending]
+    touched = {(user_id, patient_id) for _, user_id, patient_id in pending}
+
+    user_ids = {u for u, _ in touched}
+    patient_ids = {p for _, p in touched}
+    events = (
+        AnnotationEvent.objects
+        .filter(user_id__in=user_ids, patient_id__in=patient_ids)
+        .order_by("user_id", "patient_id", "occurred_at", "id")
+    )
+
+    existing = {
+        (t.user_id, t.patient_id): t
+        for t in CaseTiming.objects.filter(
+            user_id__in=user_ids, patient_id__in=patient_ids
+        )
+    }
+
+    to_create, to_update = [], []
+    pairs = attrgetter("user_id", "patient_id")
+    for pair, group in groupby(events.iterator(), key=pairs):
+        if pair not in touched:
+            continue
+        group = list(group)
+        fields = summarize(group)
+        fields["last_event_id"] = max(e.id for e in group)
+
+        timing = existing.get(pair)
+        if timing is None:
+            to_create.append(
+                CaseTiming(user_id=pair[0], patient_id=pair[1], **fields)
+            )
+        else:
+            for name, value in fields.items():
+                setattr(timing, name, value)
+            to_update.append(timing)
+
+    with transaction.atomic():
+        CaseTiming.objects.bulk_create(to_create)
+        CaseTiming.objects.bulk_update(
+            to_update,
+            ["opened_at", "submitted_at", "active_seconds",
+             "zoom_count", "save_count", "last_event_id"]
+        )
+        AnnotationEvent.objects.filter(id__in=pending_ids).update(processed=True)
+
+    return len(to_create) + len(to_update)
@@ -1,3 +1,947 @@
-from django.test import TestCase
+import json
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .admin import ESTIMATE_THRESHOLD, EstimatedCountPaginator
+from .cohorts import compile_spec, first_unannotated, materialize, neighbours
+from .drive_sync import (
+    FOLDER_MIME, HEAVY_MODULES, due_projects, fetch_images_recursive, sync_drive,
+)
+from .history import annotations_as_of, create_checkpoint
+from .models import (
+    Annotation, AnnotationChange, AnnotationEvent, CaseComment, CaseTiming,
+    Cohort, Patient, PatientImage, Project,
+)
+from .storage import StaticStorage
+from .telemetry import IDLE_CAP, ingest_events, rollup_events, summarize
+
+
+class ProjectTestCase(TestCase):
+    """
+    Tests that need a project. Migration 0012 already creates "default",
+    so reuse it, pointed at the FakeDrive root.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project.objects.get(slug="default")
+        cls.project.drive_folder_id = "root"
+        cls.project.save(update_fields=["drive_folder_id"])
+
+
+class ImportBudgetTests(SimpleTestCase):
+
+    def test_request_path_does_not_import_drive_client(self):
+        # Load settings, URLconf and views in a clean interpreter, the same
+        # way a freshly recycled worker would before its first request.
+        probe = (
+            "import json, os, sys, django\n"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'med_annotator.settings')\n"
+            "django.setup()\n"
+            "from django.urls import get_resolver\n"
+            "get_resolver().url_patterns\n"
+            "print(json.dumps(sorted(sys.modules)))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", probe],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+        heavy = [
+            m for m in loaded
+            if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)
+        ]
+        self.assertEqual(heavy, [])
+
+
+class StaticStorageTests(SimpleTestCase):
+
+    def test_unhashed_names_without_manifest(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = StaticStorage(location=root)
+            self.assertEqual(storage.url("css/base.css"), "/static/css/base.css")
+
+    def test_templates_render_without_collectstatic(self):
+        html = render_to_string("annotation_complete.html", {})
+        self.assertIn("/static/css/annotation_complete.css", html)
+
+    def test_auth_pages_use_static_bundles(self):
+        for template in (
+            "account/logout.html",
+            "socialaccount/login.html",
+        ):
+            with self.subTest(template=template):
+                html = render_to_string(template, {})
+                self.assertIn("/static/css/auth.css", html)
+                self.assertNotIn("<style", html)
+                self.assertNotIn("<script>", html)
+
+
+class AnnotationHistoryTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create(username="reader")
+        cls.patient = Patient.objects.create(patient_id="P1", project=cls.project)
+
+    def make_annotation(self):
+        return Annotation.objects.create(user=self.user, patient=self.patient)
+
+    def deltas(self, annotation_id):
+        return list(
+            AnnotationChange.objects
+            .filter(annotation_id=annotation_id)
+            .order_by("id")
+            .values_list("delta", flat=True)
+        )
+
+    def test_new_row_records_full_state(self):
+        annotation = self.make_annotation()
+        [delta] = self.deltas(annotation.id)
+        self.assertEqual(set(delta), set(Annotation.TRACKED_FIELDS))
+        self.assertEqual(delta["patient_id"], self.patient.pk)
+
+    def test_unchanged_save_records_nothing(self):
+        annotation = self.make_annotation()
+        Annotation.objects.get(pk=annotation.pk).save()
+        self.assertEqual(len(self.deltas(annotation.id)), 1)
+
+    def test_partial_change_records_only_changed_fields(self):
+        annotation = self.make_annotation()
+        loaded = Annotation.objects.get(pk=annotation.pk)
+        loaded.quality = 7
+        loaded.save()
+        self.assertEqual(self.deltas(annotation.id)[-1], {"quality": 7})
+
+    def test_update_fields_limits_delta_to_saved_fields(self):
+        annotation = self.make_annotation()
+        loaded = Annotation.objects.get(pk=annotation.pk)
+        loaded.quality = 7
+        loaded.comment = "unsaved"
+        loaded.save(update_fields=["quality"])
+        self.assertEqual(self.deltas(annotation.id)[-1], {"quality": 7})
+
+        # The unsaved comment is still pending and recorded when saved
+        loaded.save(update_fields=["comment"])
+        self.assertEqual(self.deltas(annotation.id)[-1], {"comment": "unsaved"})
+
+    def test_history_survives_delete(self):
+        annotation = self.make_annotation()
+        annotation_id = annotation.id
+        annotation.delete()
+        self.assertEqual(
+            self.deltas(annotation_id)[-1], AnnotationChange.TOMBSTONE
+        )
+        self.assertEqual(len(self.deltas(annotation_id)), 2)
+
+    def test_deleted_annotations_drop_out_of_state(self):
+        kept = self.make_annotation()
+        other = Patient.objects.create(patient_id="P2", project=self.project)
+        deleted = Annotation.objects.create(user=self.user, patient=other)
+        deleted_id = deleted.id
+        before = timezone.now()
+
+        deleted.delete()
+
+        self.assertIn(deleted_id, annotations_as_of(before))
+        self.assertNotIn(deleted_id, annotations_as_of(timezone.now()))
+
+        checkpoint = create_checkpoint(settle=timedelta(0))
+        self.assertEqual(set(checkpoint.state), {str(kept.id)})
+        self.assertNotIn(deleted_id, annotations_as_of(timezone.now()))
+
+    def test_cascade_delete_is_recorded(self):
+        annotation = self.make_annotation()
+        annotation_id = annotation.id
+
+        self.patient.delete()
+
+        self.assertEqual(
+            self.deltas(annotation_id)[-1], AnnotationChange.TOMBSTONE
+        )
+        self.assertNotIn(annotation_id, annotations_as_of(timezone.now()))
+
+    def test_reconstruction_around_checkpoint(self):
+        annotation = self.make_annotation()
+        loaded = Annotation.objects.get(pk=annotation.pk)
+        loaded.quality = 3
+        loaded.save()
+        before = timezone.now()
+
+        checkpoint = create_checkpoint(settle=timedelta(0))
+
+        loaded.quality = 9
+        loaded.comment = "late"
+        loaded.save()
+
+        self.assertEqual(annotations_as_of(before)[annotation.id]["quality"], 3)
+        after = annotations_as_of(timezone.now())[annotation.id]
+        self.assertEqual((after["quality"], after["comment"]), (9, "late"))
+        self.assertEqual(checkpoint.state[str(annotation.id)]["quality"], 3)
+
+    def test_change_in_flight_during_checkpoint_is_replayed(self):
+        annotation = self.make_annotation()
+        checkpoint = create_checkpoint(settle=timedelta(0))
+
+        # Committed after the checkpoint, but stamped before it
+        AnnotationChange.objects.create(
+            annotation=annotation,
+            changed_at=checkpoint.created_at - timedelta(seconds=1),
+            delta={"quality": 5}
+        )
+
+        state = annotations_as_of(timezone.now(), [annotation.id])
+        self.assertEqual(state[annotation.id]["quality"], 5)
+
+    def test_checkpoint_leaves_unsettled_changes_for_replay(self):
+        annotation = self.make_annotation()
+        checkpoint = create_checkpoint()
+        self.assertEqual(checkpoint.state, {})
+
+        state = annotations_as_of(timezone.now())
+        self.assertIn(annotation.id, state)
+
+
+class FakeDrive:
+    """Minimal stand-in for the Drive v3 service: {folder_id: [files]}."""
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def files(self):
+        return self
+
+    def list(self, q, fields):
+        self.parent = q.split("'")[1]
+        return self
+
+    def execute(self):
+        return {"files": self.tree.get(self.parent, [])}
+
+
+def drive_folder(file_id, name):
+    return {"id": file_id, "name": name, "mimeType": FOLDER_MIME}
+
+
+def drive_image(file_id, name, md5=None):
+    f = {"id": file_id, "name": name, "mimeType": "image/jpeg"}
+    if md5:
+        f["md5Checksum"] = md5
+    return f
+
+
+class DriveDedupTests(ProjectTestCase):
+
+    def test_fetch_skips_seen_checksums(self):
+        patient = Patient.objects.create(patient_id="C1", project=self.project)
+        drive = FakeDrive({
+            "c1": [
+                drive_image("a", "C1_early.jpg", md5="m1"),
+                drive_image("b", "C1_early_copy.jpg", md5="m1"),
+                drive_folder("late", "Late"),
+            ],
+            "late": [drive_image("c", "scan.jpg")],
+        })
+
+        collected, seen = [], set()
+        fetch_images_recursive(drive, "c1", patient, collected, seen=seen)
+
+        self.assertEqual([i.checksum for i in collected], ["m1", "c"])
+        self.assertEqual([i.stage for i in collected], ["early", "late"])
+        self.assertEqual(seen, {"m1", "c"})
+
+    def test_sync_drops_cross_patient_duplicates(self):
+        drive = FakeDrive({
+            "root": [drive_folder("f1", "C1"), drive_folder("f2", "C2")],
+            "f1": [drive_image("a", "early.jpg", md5="same")],
+            "f2": [
+                drive_image("b", "early.jpg", md5="same"),
+                drive_image("c", "late.jpg", md5="other"),
+            ],
+        })
+
+        with mock.patch("annotations.drive_sync.build_drive_service", return_value=drive):
+            sync_drive(self.project)
+
+        self.assertEqual(
+            sorted(PatientImage.objects.values_list("patient__patient_id", "checksum")),
+            [("C1", "same"), ("C2", "other")]
+        )
+
+    def test_report_lists_legacy_duplicates(self):
+        for pid in ("C1", "C2"):
+            patient = Patient.objects.create(patient_id=pid, project=self.project)
+            PatientImage.objects.create(
+                patient=patient,
+                stage="mid",
+                image_url="https://lh3.googleusercontent.com/d/legacy"
+            )
+
+        out = StringIO()
+        call_command("find_duplicate_images", stdout=out)
+        self.assertIn("1 duplicated image(s)", out.getvalue())
+
+    def test_report_flags_file_id_checksums(self):
+        patient = Patient.objects.create(patient_id="C1", project=self.project)
+        PatientImage.objects.create(
+            patient=patient, stage="mid", checksum="abc",
+            image_url="https://lh3.googleusercontent.com/d/abc"
+        )
+        PatientImage.objects.create(
+            patient=patient, stage="late", checksum="0cc175b9c0f1b6a831c399e269772661",
+            image_url="https://lh3.googleusercontent.com/d/def"
+        )
+
+        out = StringIO()
+        call_command("find_duplicate_images", stdout=out)
+        self.assertIn("No cross-patient duplicates.", out.getvalue())
+        self.assertIn("default: 1 image(s) keyed by Drive file id", out.getvalue())
+
+
+class ProjectSyncTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.study = Project.objects.create(
+            slug="study", name="Study", drive_folder_id="study-root"
+        )
+
+    def sync(self, project, drive):
+        with mock.patch("annotations.drive_sync.build_drive_service", return_value=drive):
+            sync_drive(project)
+
+    def test_projects_can_share_folder_names(self):
+        drive = FakeDrive({
+            "root": [drive_folder("f1", "C1")],
+            "f1": [drive_image("a", "early.jpg", md5="m1")],
+            "study-root": [drive_folder("s1", "C1")],
+            "s1": [drive_image("b", "late.jpg", md5="m2")],
+        })
+
+        self.sync(self.project, drive)
+        self.sync(self.study, drive)
+
+        self.assertEqual(
+            sorted(PatientImage.objects.values_list(
+                "patient__project__slug", "patient__patient_id", "checksum"
+            )),
+            [("default", "C1", "m1"), ("study", "C1", "m2")],
+        )
+        self.study.refresh_from_db()
+        self.assertIsNotNone(self.study.last_synced_at)
+
+    def test_queue_and_telemetry_resolve_patient_within_project(self):
+        Patient.objects.create(patient_id="C1", project=self.project)
+        study_case = Patient.objects.create(patient_id="C1", project=self.study)
+        user = get_user_model().objects.create(username="reader")
+        self.client.defaults["HTTP_HOST"] = "localhost"
+        self.client.force_login(user)
+
+        response = self.client.get("/?project=study&patient_id=C1")
+        self.assertEqual(response.context["patient"], study_case)
+
+        ingest_events(user, [{
+            "kind": "open", "project": "study", "patient_id": "C1",
+            "ts": timezone.now().timestamp() * 1000,
+        }])
+        self.assertEqual(AnnotationEvent.objects.get().patient, study_case)
+
+    def test_due_projects_follow_sync_interval(self):
+        now = timezone.now()
+        Project.objects.filter(pk=self.project.pk).update(
+            sync_interval=60, last_synced_at=now - timedelta(minutes=30)
+        )
+        Project.objects.filter(pk=self.study.pk).update(sync_interval=60)
+        manual = Project.objects.create(slug="manual", name="Manual", drive_folder_id="m")
+
+        self.assertEqual([p.slug for p in due_projects(now)], ["study"])
+        self.assertEqual(
+            {p.slug for p in due_projects(now + timedelta(minutes=30))},
+            {"default", "study"},
+        )
+        self.assertNotIn(manual, due_projects(now + timedelta(days=1)))
+
+    def test_sync_projects_runs_due_and_named_projects(self):
+        Project.objects.filter(pk=self.study.pk).update(sync_interval=60)
+
+        out, err = StringIO(), StringIO()
+        with mock.patch("annotations.management.commands.sync_projects.sync_drive") as sync:
+            call_command("sync_projects", stdout=out, stderr=err)
+            self.assertEqual([c.args[0].slug for c in sync.call_args_list], ["study"])
+
+            sync.reset_mock()
+            call_command("sync_projects", project=["default"], stdout=out, stderr=err)
+            self.assertEqual([c.args[0].slug for c in sync.call_args_list], ["default"])
+
+        self.assertIn("study: synced", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("sync_projects", project=["nope"], stdout=out, stderr=err)
+
+    def test_sync_projects_reports_failures(self):
+        out, err = StringIO(), StringIO()
+        with mock.patch(
+            "annotations.management.commands.sync_projects.sync_drive",
+            side_effect=RuntimeError("quota exceeded"),
+        ):
+            call_command("sync_projects", project=["study"], stdout=out, stderr=err)
+
+        self.assertIn("study: sync failed: quota exceeded", err.getvalue())
+        self.assertNotIn("synced", out.getvalue())
+
+
+class ConditionalGetTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create(username="reader")
+        cls.patient = Patient.objects.create(patient_id="P1", project=cls.project)
+        cls.image = PatientImage.objects.create(
+            patient=cls.patient, stage="early", image_url="https://example.com/d/one"
+        )
+        cls.comment = CaseComment.objects.create(
+            patient=cls.patient, user=cls.user, comment="first read"
+        )
+
+    def setUp(self):
+        self.client.defaults["HTTP_HOST"] = "localhost"
+        self.client.force_login(self.user)
+        self.url = "/?patient_id=P1"
+        # First visit creates the annotation and sets the CSRF cookie,
+        # both of which are part of the ETag
+        self.client.get(self.url)
+
+    def test_unchanged_page_returns_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_comment_edit_invalidates_page_and_fragment(self):
+        first = self.client.get(self.url)
+        self.assertContains(first, "first read")
+
+        self.comment.comment = "revised read"
+        self.comment.save()
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertContains(again, "revised read")
+
+    def test_image_edit_invalidates_page_and_fragment(self):
+        first = self.client.get(self.url)
+
+        self.image.image_url = "https://example.com/d/two"
+        self.image.save()
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertContains(again, "https://example.com/d/two")
+
+    def test_image_changes_advance_last_modified(self):
+        first = self.client.get(self.url)
+
+        PatientImage.objects.filter(pk=self.image.pk).update(
+            updated_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        again = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+        self.assertEqual(again.status_code, 200)
+
+    def test_annotation_save_invalidates_page(self):
+        first = self.client.get(self.url)
+        annotation = Annotation.objects.get(user=self.user, patient=self.patient)
+
+        self.client.post("/", {
+            "annotation_id": annotation.id,
+            "action": "save",
+            "quality": 4,
+        })
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 200)
+
+
+class CohortTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User = get_user_model()
+        cls.first = User.objects.create(username="first")
+        cls.second = User.objects.create(username="second")
+        other = Project.objects.create(slug="other", name="Other", drive_folder_id="o")
+
+        # P1: early + late, two readers who disagree
+        p1 = Patient.objects.create(patient_id="P1", project=cls.project)
+        PatientImage.objects.create(patient=p1, stage="early", image_url="https://x/d/1")
+        PatientImage.objects.create(patient=p1, stage="late", image_url="https://x/d/2")
+        now = timezone.now()
+        Annotation.objects.create(
+            patient=p1, user=cls.first, quality=3, activity="active", submitted_at=now
+        )
+        Annotation.objects.create(
+            patient=p1, user=cls.second, quality=8, activity="inactive", submitted_at=now
+        )
+
+        # P2: late only, one reader
+        p2 = Patient.objects.create(patient_id="P2", project=cls.project)
+        PatientImage.objects.create(patient=p2, stage="late", image_url="https://x/d/3")
+        PatientImage.objects.create(patient=p2, stage="late", image_url="https://x/d/4")
+        Annotation.objects.create(
+            patient=p2, user=cls.first, quality=5, activity="active", submitted_at=now
+        )
+
+        # P3: opened by the second reader, never submitted
+        p3 = Patient.objects.create(patient_id="P3", project=cls.project)
+        Annotation.objects.create(patient=p3, user=cls.second)
+
+        # P4: another project
+        p4 = Patient.objects.create(patient_id="P4", project=other)
+        PatientImage.objects.create(patient=p4, stage="early", image_url="https://x/d/5")
+
+    def matching(self, spec, project="default"):
+        if project is not None:
+            project = Project.objects.get(slug=project)
+        return sorted(compile_spec(spec, project=project).values_list("patient_id", flat=True))
+
+    def test_each_filter_key(self):
+        cases = [
+            ({"has_stage": "early"}, ["P1"]),
+            ({"has_stage": ["late"]}, ["P1", "P2"]),
+            ({"stages_only": ["late"]}, ["P2"]),
+            ({"min_images": 2}, ["P1", "P2"]),
+            ({"max_images": 0}, ["P3"]),
+            ({"disagree": "quality"}, ["P1"]),
+            ({"disagree": "activity"}, ["P1"]),
+            ({"quality_lt": 4}, ["P1"]),
+            ({"quality_gte": "5"}, ["P1", "P2"]),
+            ({"activity": "inactive"}, ["P1"]),
+            ({"unannotated": True}, ["P3"]),
+            ({"unannotated": False}, ["P1", "P2", "P3"]),
+            ({"quality_lt": 4, "min_images": 2}, ["P1"]),
+            ({}, ["P1", "P2", "P3"]),
+        ]
+        for spec, expected in cases:
+            with self.subTest(spec=spec):
+                self.assertEqual(self.matching(spec), expected)
+
+    def test_disagreement_ignores_cases_only_opened(self):
+        case = Patient.objects.create(patient_id="P5", project=self.project)
+        Annotation.objects.create(
+            patient=case, user=self.first, vasculitis_present=True,
+            submitted_at=timezone.now(),
+        )
+        # Opening the page creates a blank row with vasculitis_present=False
+        opened = Annotation.objects.create(patient=case, user=self.second)
+
+        self.assertEqual(self.matching({"disagree": "vasculitis_present"}), [])
+
+        opened.submitted_at = timezone.now()
+        opened.save()
+        self.assertEqual(self.matching({"disagree": "vasculitis_present"}), ["P5"])
+
+    def test_without_project_spans_all_projects(self):
+        self.assertEqual(self.matching({"has_stage": "early"}, project=None), ["P1", "P4"])
+
+    def test_invalid_specs_raise_value_error(self):
+        for spec in (
+            [1], None, "late",
+            {"quality_lt": None},
+            {"quality_gte": [4]},
+            {"min_images": "many"},
+            {"max_images": True},
+            {"has_stage": 5},
+            {"has_stage": ["nope"]},
+            {"stages_only": [["late"]]},
+            {"disagree": ["quality"]},
+            {"disagree": "comment"},
+            {"activity": ["active"]},
+            {"activity": "sleeping"},
+            {"bogus": 1},
+        ):
+            with self.subTest(spec=spec):
+                with self.assertRaises(ValueError):
+                    compile_spec(spec)
+
+    def test_build_cohort_rejects_non_object_spec(self):
+        for raw in ("[1]", "null", '{"quality_lt": null}'):
+            with self.subTest(spec=raw):
+                with self.assertRaises(CommandError):
+                    call_command("build_cohort", "bad", spec=raw, project="default")
+        self.assertFalse(Cohort.objects.filter(name="bad").exists())
+
+    def test_admin_rematerialize_reports_bad_spec(self):
+        admin = get_user_model().objects.create_superuser("admin", "a@example.com", "pw")
+        cohort = Cohort.objects.create(name="broken", project=self.project, spec=[1])
+        self.client.defaults["HTTP_HOST"] = "localhost"
+        self.client.force_login(admin)
+
+        response = self.client.post(
+            "/admin/annotations/cohort/",
+            {"action": "rematerialize", "_selected_action": [cohort.pk]},
+            follow=True,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Cohort spec must be a JSON object")
+
+    def test_navigation_follows_member_order(self):
+        cohort = Cohort.objects.create(name="all", project=self.project, spec={})
+        self.assertEqual(materialize(cohort), 3)
+
+        self.assertEqual(neighbours(cohort, "P1"), (None, "P2"))
+        self.assertEqual(neighbours(cohort, "P2"), ("P1", "P3"))
+        self.assertEqual(neighbours(cohort, "P3"), ("P2", None))
+        self.assertEqual(neighbours(cohort, "P4"), (None, None))
+
+        self.assertEqual(first_unannotated(cohort, self.first), "P3")
+        self.assertEqual(first_unannotated(cohort, self.second), "P2")
+        Annotation.objects.create(
+            patient=Patient.objects.get(patient_id="P2"), user=self.second,
+            submitted_at=timezone.now(),
+        )
+        self.assertEqual(first_unannotated(cohort, self.second), "P3")
+        Annotation.objects.filter(patient__patient_id="P3", user=self.second).update(
+            submitted_at=timezone.now()
+        )
+        self.assertIsNone(first_unannotated(cohort, self.second))
+
+    def test_rematerialize_replaces_members(self):
+        cohort = Cohort.objects.create(
+            name="late", project=self.project, spec={"has_stage": "late"}
+        )
+        self.assertEqual(materialize(cohort), 2)
+
+        cohort.spec = {"stages_only": "late"}
+        self.assertEqual(materialize(cohort), 1)
+        self.assertEqual(
+            list(cohort.members.values_list("patient__patient_id", "position")), [("P2", 0)]
+        )
+        self.assertIsNotNone(cohort.materialized_at)
+
+
+class AdminActionTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser("admin", "a@example.com", "pw")
+        cls.alice = User.objects.create(username="alice")
+        cls.bob = User.objects.create(username="bob")
+        cls.p1, cls.p2, cls.p3 = (
+            Patient.objects.create(patient_id=pid, project=cls.project)
+            for pid in ("P1", "P2", "P3")
+        )
+        PatientImage.objects.create(patient=cls.p1, stage="early", image_url="https://x/d/1")
+        PatientImage.objects.create(patient=cls.p1, stage="late", image_url="https://x/d/2")
+
+    def setUp(self):
+        self.client.defaults["HTTP_HOST"] = "localhost"
+        self.client.force_login(self.admin)
+
+    def run_action(self, url, action, selected, **extra):
+        return self.client.post(
+            url,
+            {"action": action, "_selected_action": [a.pk for a in selected], **extra},
+            follow=True,
+        )
+
+    def test_reassign_skips_cases_target_already_has(self):
+        moved = Annotation.objects.create(user=self.alice, patient=self.p1)
+        kept = Annotation.objects.create(user=self.alice, patient=self.p2)
+        Annotation.objects.create(user=self.bob, patient=self.p2)
+
+        response = self.run_action(
+            "/admin/annotations/annotation/", "reassign", [moved, kept],
+            target_user=self.bob.pk,
+        )
+
+        self.assertContains(response, "Reassigned 1 annotation(s) to bob.")
+        self.assertContains(response, "Skipped 1 for cases bob already has.")
+        moved.refresh_from_db()
+        kept.refresh_from_db()
+        self.assertEqual((moved.user, kept.user), (self.bob, self.alice))
+        self.assertEqual(
+            list(moved.changes.values_list("delta", flat=True))[-1],
+            {"user_id": self.bob.pk},
+        )
+
+    def test_reassign_counts_selection_before_filter_drops_it(self):
+        selected = [
+            Annotation.objects.create(user=self.alice, patient=p)
+            for p in (self.p1, self.p2, self.p3)
+        ]
+
+        response = self.run_action(
+            "/admin/annotations/annotation/?q=alice", "reassign", selected,
+            target_user=self.bob.pk,
+        )
+
+        self.assertContains(response, "Reassigned 3 annotation(s) to bob.")
+        self.assertNotContains(response, "Skipped")
+
+    def test_reset_clears_fields_and_records_history(self):
+        annotation = Annotation.objects.create(
+            user=self.alice, patient=self.p1,
+            vasculitis_present=True, activity="active", quality=7, comment="note",
+            submitted_at=timezone.now(),
+        )
+
+        response = self.run_action(
+            "/admin/annotations/annotation/", "reset_annotations", [annotation]
+        )
+
+        self.assertContains(response, "Reset 1 annotation(s).")
+        annotation.refresh_from_db()
+        self.assertEqual(
+            (annotation.vasculitis_present, annotation.activity,
+             annotation.quality, annotation.comment, annotation.submitted_at),
+            (False, None, None, None, None),
+        )
+        cleared = {"vasculitis_present": False, "activity": None, "quality": None, "comment": None}
+        self.assertEqual(annotation.changes.order_by("id").last().delta, cleared)
+        self.assertEqual(
+            annotations_as_of(timezone.now(), [annotation.id])[annotation.id]["quality"], None
+        )
+
+    def test_resync_groups_patients_by_project(self):
+        with mock.patch("annotations.drive_sync.sync_drive") as sync:
+            response = self.run_action(
+                "/admin/annotations/patient/", "resync_from_drive", [self.p1, self.p2]
+            )
+
+        self.assertContains(response, "re-synced 2 patient(s)")
+        sync.assert_called_once()
+        project = sync.call_args.args[0]
+        self.assertEqual(project, self.project)
+        self.assertCountEqual(sync.call_args.kwargs["patient_ids"], ["P1", "P2"])
+
+    def test_resync_reports_drive_errors(self):
+        with mock.patch(
+            "annotations.drive_sync.sync_drive", side_effect=RuntimeError("no credentials")
+        ):
+            response = self.run_action(
+                "/admin/annotations/patient/", "resync_from_drive", [self.p1]
+            )
+
+        self.assertContains(response, "Drive sync failed: no credentials")
+
+    def test_patient_changelist_counts(self):
+        Annotation.objects.create(user=self.alice, patient=self.p1)
+        Annotation.objects.create(user=self.bob, patient=self.p1)
+
+        response = self.client.get("/admin/annotations/patient/")
+
+        counts = {
+            p.patient_id: (p.image_count, p.annotation_count)
+            for p in response.context["cl"].result_list
+        }
+        self.assertEqual(counts, {"P1": (2, 2), "P2": (0, 0), "P3": (0, 0)})
+
+
+class EstimatedCountPaginatorTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for pid in ("P1", "P2", "P3"):
+            Patient.objects.create(patient_id=pid, project=cls.project)
+
+    def postgres(self, estimate):
+        # Stand-in connection whose pg_class lookup returns `estimate`
+        connection = mock.MagicMock(vendor="postgresql")
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (estimate,)
+        return mock.patch("annotations.admin.connections", {"default": connection})
+
+    def test_exact_count_on_other_databases(self):
+        self.assertEqual(EstimatedCountPaginator(Patient.objects.order_by("pk"), 50).count, 3)
+
+    def test_estimate_for_large_unfiltered_table(self):
+        with self.postgres(ESTIMATE_THRESHOLD * 5):
+            paginator = EstimatedCountPaginator(Patient.objects.order_by("pk"), 50)
+            self.assertEqual(paginator.count, ESTIMATE_THRESHOLD * 5)
+
+    def test_exact_count_for_small_or_filtered_tables(self):
+        with self.postgres(ESTIMATE_THRESHOLD - 1):
+            paginator = EstimatedCountPaginator(Patient.objects.order_by("pk"), 50)
+            self.assertEqual(paginator.count, 3)
+
+        with self.postgres(ESTIMATE_THRESHOLD * 5):
+            filtered = Patient.objects.filter(patient_id="P1").order_by("pk")
+            self.assertEqual(EstimatedCountPaginator(filtered, 50).count, 1)
+
+
+class QueueLinkTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create(username="reader")
+        cls.study = Project.objects.create(
+            slug="study", name="Study", drive_folder_id="study-root"
+        )
+        Patient.objects.create(patient_id="P1", project=cls.study)
+
+    def setUp(self):
+        self.client.defaults["HTTP_HOST"] = "localhost"
+        self.client.force_login(self.user)
+
+    def test_annotation_page_links_keep_project(self):
+        response = self.client.get("/?project=study&patient_id=P1")
+
+        self.assertEqual(response.context["exit_url"], "/?project=study")
+        self.assertContains(response, 'href="/?project=study"')
+        self.assertContains(response, 'href="/?project=study&amp;sync=true"')
+
+    def test_complete_page_links_keep_project(self):
+        Annotation.objects.create(
+            patient=Patient.objects.get(patient_id="P1"),
+            user=self.user,
+            submitted_at=timezone.now(),
+        )
+
+        response = self.client.get("/?project=study")
+
+        self.assertTemplateUsed(response, "annotation_complete.html")
+        self.assertEqual(response.context["project"], self.study)
+        self.assertContains(response, 'href="/?project=study&amp;sync=true"')
+
+    def test_only_submit_takes_a_case_out_of_the_queue(self):
+        self.client.get("/?project=study")
+        annotation = Annotation.objects.get(user=self.user)
+
+        self.client.post("/", {
+            "annotation_id": annotation.id, "project": "study",
+            "action": "save", "quality": 4,
+        })
+        annotation.refresh_from_db()
+        self.assertIsNone(annotation.submitted_at)
+        response = self.client.get("/?project=study")
+        self.assertTemplateUsed(response, "annotation_page.html")
+
+        self.client.post("/", {
+            "annotation_id": annotation.id, "project": "study",
+            "action": "save_and_next", "quality": 4,
+        })
+        annotation.refresh_from_db()
+        self.assertIsNotNone(annotation.submitted_at)
+        response = self.client.get("/?project=study")
+        self.assertTemplateUsed(response, "annotation_complete.html")
+
+    def test_chooser_lists_every_project(self):
+        response = self.client.get("/?project=study&patient_id=P1")
+
+        projects = response.context["projects"]
+        self.assertEqual([p["slug"] for p in projects], ["default", "study"])
+        self.assertEqual([p["current"] for p in projects], [False, True])
+        self.assertContains(response, 'href="/?project=default"')
+
+
+class TelemetryTests(ProjectTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create(username="reader")
+        cls.patient = Patient.objects.create(patient_id="P1", project=cls.project)
+        cls.t0 = timezone.now() - timedelta(hours=1)
+
+    def event(self, kind, seconds):
+        return AnnotationEvent(
+            user=self.user,
+            patient=self.patient,
+            kind=kind,
+            occurred_at=self.t0 + timedelta(seconds=seconds)
+        )
+
+    def test_summarize_caps_idle_gaps(self):
+        events = [
+            self.event("open", 0),
+            self.event("zoom", 30),
+            self.event("save", 30 + 3600),
+            self.event("submit", 30 + 3600 + 10),
+        ]
+        summary = summarize(events)
+
+        self.assertEqual(
+            summary["active_seconds"],
+            30 + IDLE_CAP.total_seconds() + 10
+        )
+        self.assertEqual(summary["opened_at"], events[0].occurred_at)
+        self.assertEqual(summary["submitted_at"], events[-1].occurred_at)
+        self.assertEqual((summary["zoom_count"], summary["save_count"]), (1, 1))
+
+    def test_summarize_keeps_first_open_and_last_submit(self):
+        events = [
+            self.event("open", 0),
+            self.event("submit", 10),
+            self.event("open", 20),
+            self.event("submit", 40),
+        ]
+        summary = summarize(events)
+        self.assertEqual(summary["opened_at"], events[0].occurred_at)
+        self.assertEqual(summary["submitted_at"], events[-1].occurred_at)
+
+    def test_ingest_drops_bad_events_and_clamps_future(self):
+        other = Project.objects.create(slug="other", name="Other", drive_folder_id="o")
+        same_name = Patient.objects.create(patient_id="P1", project=other)
+        now_ms = timezone.now().timestamp() * 1000
+        stored = ingest_events(self.user, [
+            {"kind": "open", "project": "default", "patient_id": "P1", "ts": now_ms - 1000},
+            {"kind": "open", "project": "default", "patient_id": "P1", "ts": now_ms + 10 ** 9},
+            {"kind": "bogus", "project": "default", "patient_id": "P1", "ts": now_ms},
+            {"kind": "zoom", "project": "default", "patient_id": "NOPE", "ts": now_ms},
+            {"kind": "zoom", "project": "other", "patient_id": "P1", "ts": now_ms},
+            {"kind": "zoom", "project": "missing", "patient_id": "P1", "ts": now_ms},
+            {"kind": "zoom", "patient_id": "P1", "ts": now_ms},
+            {"kind": "zoom", "project": "default", "patient_id": "P1"},
+            {"kind": "zoom", "project": "default", "patient_id": "P1", "ts": "soon"},
+            "not an event",
+        ])
+
+        self.assertEqual(stored, 3)
+        self.assertEqual(
+            sorted(AnnotationEvent.objects.values_list("patient", flat=True)),
+            sorted([self.patient.pk, self.patient.pk, same_name.pk]),
+        )
+        latest = AnnotationEvent.objects.latest("occurred_at").occurred_at
+        self.assertLessEqual(latest, timezone.now())
+
+    def test_rollup_picks_up_late_committed_events(self):
+        # The lower-numbered event committed after a roll-up had already
+        # processed the higher-numbered one
+        early = self.event("open", 0)
+        early.save()
+        late = self.event("submit", 60)
+        late.processed = True
+        late.save()
+
+        self.assertEqual(rollup_events(), 1)
+
+        timing = CaseTiming.objects.get(user=self.user, patient=self.patient)
+        self.assertEqual(timing.active_seconds, 60)
+        self.assertEqual(rollup_events(), 0)
@@ -1,6 +1,6 @@
 # annotations/urls.py
 from django.urls import path
-from .views import AnnotationQueueView
+from .views import AnnotationQueueView, TelemetryView
 
 urlpatterns = [
     # The main homepage is now the annotation queue
@@ -8,4 +8,7 @@ urlpatterns = [
     
     # We also need a POST URL for the form submission
     path('save_annotation/', AnnotationQueueView.as_view(), name='save_annotation'),
+
+    # Batched reader telemetry from the annotation page
+    path('telemetry/', TelemetryView.as_view(), name='telemetry'),
 ]
\ No newline at end of file
@@ -1,74 +1,96 @@
-import os
-import re
+import hashlib
+import json
 from collections import defaultdict
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-
 from django.urls import reverse
-from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.contrib.messages import get_messages
 from django.db import transaction
+from django.db.models import Count, Max
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date, urlencode
 
-from .models import Patient, PatientImage, Annotation, CaseComment
+from . import cohorts
+from .models import Patient, Annotation, CaseComment, Cohort, Project
 from .forms import PatientAnnotationForm
+from .drive_sync import sync_drive
+from .telemetry import ingest_events
 
 
-# ================================
-# Constants
-# ================================
-MAIN_FOLDER_ID = "1_vDh3Oizwndg_9Q7D8yJPjERswzZwocu"
-FOLDER_MIME = "application/vnd.google-apps.folder"
-STAGE_REGEX = re.compile(r"(early|mid|late)", re.IGNORECASE)
+def queue_url(patient_id=None, project=None, cohort=None):
+    params = {}
+    if patient_id:
+        params["patient_id"] = patient_id
+    if project:
+        params["project"] = project.slug
+    if cohort:
+        params["cohort"] = cohort.name
+    url = reverse("annotation_queue")
+    return f"{url}?{urlencode(params)}" if params else url
 
 
 # ================================
-# Recursive Google Drive Scanner
+# Page Versioning
 # ================================
-def fetch_images_recursive(service, folder_id, patient, collected, folder_name=""):
-    results = service.files().list(
-        q=f"'{folder_id}' in parents and trashed=false",
-        fields="files(id, name, mimeType)"
-    ).execute()
-
-    for f in results.get("files", []):
-
-        # Recurse into subfolders
-        if f["mimeType"] == FOLDER_MIME:
-            fetch_images_recursive(
-                service,
-                f["id"],
-                patient,
-                collected,
-                folder_name=f["name"]
-            )
-            continue
-
-        # Ignore non-images
-        if not f["mimeType"].startswith("image/"):
-            continue
-
-        # Determine stage
-        match = STAGE_REGEX.search(f["name"])
-        if match:
-            stage = match.group(1).lower()
-        else:
-            folder_match = STAGE_REGEX.search(folder_name.lower())
-            stage = folder_match.group(1).lower() if folder_match else "mid"
-
-        image_url = f"https://lh3.googleusercontent.com/d/{f['id']}"
-
-        collected.append(
-            PatientImage(
-                patient=patient,
-                stage=stage,
-                image_url=image_url
-            )
-        )
+def page_versions(request, patient, annotation):
+    """
+    Cheap fingerprints of everything the annotation page renders for
+    `patient`, used for conditional GET and fragment cache keys.
+    """
+    images = patient.images.aggregate(
+        n=Count("id"), last=Max("id"), at=Max("updated_at")
+    )
+    comments = CaseComment.objects.filter(patient=patient).aggregate(
+        n=Count("id"), last=Max("id"), at=Max("updated_at")
+    )
+    others = Annotation.objects.filter(patient=patient).exclude(
+        user=request.user
+    ).aggregate(at=Max("annotated_at"))
+
+    timestamps = [
+        t for t in (
+            patient.created_at,
+            annotation.annotated_at,
+            images["at"],
+            comments["at"],
+            others["at"],
+        ) if t
+    ]
+
+    def stamp(agg):
+        # Count and max id catch inserts/deletes; updated_at catches edits
+        at = agg["at"].timestamp() if agg["at"] else 0
+        return f"{agg['n']}-{agg['last']}-{at}"
+
+    return {
+        "gallery": stamp(images),
+        "comments": stamp(comments),
+        "annotation": f"{annotation.id}-{annotation.annotated_at.timestamp()}",
+        "others": others["at"].timestamp() if others["at"] else 0,
+        # Whole seconds, as HTTP dates and get_conditional_response expect
+        "last_modified": int(max(timestamps).timestamp()) if timestamps else None,
+    }
+
+
+def make_etag(versions, *extra):
+    parts = [
+        versions["gallery"],
+        versions["comments"],
+        versions["annotation"],
+        versions["others"],
+        *extra,
+    ]
+    digest = hashlib.md5(
+        "|".join(str(p) for p in parts).encode(),
+        usedforsecurity=False
+    ).hexdigest()
+    return f'W/"{digest}"'
 
 
 # ================================
@@ -81,39 +103,41 @@ class AnnotationQueueView(LoginRequiredMixin, View):
     # ----------------------------
     def get(self, request):
 
+        cohort = self.get_cohort(request)
+        project = cohort.project if cohort else self.get_project(request)
+
+        if not project:
+            return render(
+                request,
+                "annotation_complete.html",
+                self.queue_context(project, cohort)
+            )
+
         # Sync from Drive if requested
         if request.GET.get("sync") == "true":
             try:
-                self.sync_drive()
+                sync_drive(project)
                 messages.success(request, "Images synced successfully.")
-                return redirect("annotation_queue")
             except Exception as e:
                 messages.error(request, f"Drive sync failed: {e}")
-                return redirect("annotation_queue")
+            return redirect(queue_url(None, project, cohort))
 
         requested_patient_id = request.GET.get("patient_id")
 
-        # Patients already annotated by this user
-        annotated_ids = Annotation.objects.filter(
-            user=request.user,
-            annotated_at__isnull=False
-        ).values_list("patient__patient_id", flat=True)
-
         # Choose patient
         if requested_patient_id:
             patient = Patient.objects.filter(
+                project=project,
                 patient_id=requested_patient_id
             ).first()
         else:
-            patient = Patient.objects.exclude(
-                patient_id__in=annotated_ids
-            ).order_by("patient_id").first()
+            patient = self.next_unannotated(request.user, project, cohort)
 
         if not patient:
             return render(
                 request,
                 "annotation_complete.html",
-                {"no_patients": True}
+                self.queue_context(project, cohort)
             )
 
         # Get or create annotation
@@ -122,6 +146,50 @@ class AnnotationQueueView(LoginRequiredMixin, View):
             user=request.user
         )
 
+        # Neighbouring cases for prev/next navigation
+        if cohort:
+            prev_patient_id, next_patient_id = cohorts.neighbours(
+                cohort, patient.patient_id
+            )
+        else:
+            prev_patient_id = (
+                Patient.objects
+                .filter(project=project, patient_id__lt=patient.patient_id)
+                .order_by("-patient_id")
+                .values_list("patient_id", flat=True)
+                .first()
+            )
+            next_patient_id = (
+                Patient.objects
+                .filter(project=project, patient_id__gt=patient.patient_id)
+                .order_by("patient_id")
+                .values_list("patient_id", flat=True)
+                .first()
+            )
+
+        queue = self.queue_context(project, cohort)
+        versions = page_versions(request, patient, annotation)
+        etag = make_etag(
+            versions,
+            prev_patient_id,
+            next_patient_id,
+            project.slug,
+            cohort.name if cohort else "",
+            ",".join(p["slug"] for p in queue["projects"]),
+            request.META.get("CSRF_COOKIE", "")
+        )
+
+        # Unchanged case: let the browser reuse its copy. Pending flash
+        # messages are only shown on a full render, so skip the 304 then.
+        if request.method in ("GET", "HEAD") and not len(get_messages(request)):
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=versions["last_modified"]
+            )
+            if response is not None:
+                return response
+
         form = PatientAnnotationForm(instance=annotation)
 
         # Shared committed comments
@@ -132,39 +200,41 @@ class AnnotationQueueView(LoginRequiredMixin, View):
             .order_by("id")
         )
 
-
         # Previous user's annotation (read-only reference)
         previous_annotation = Annotation.objects.filter(
             patient=patient
         ).exclude(user=request.user).order_by("-annotated_at").first()
 
-        # Group images by stage
-        image_groups = defaultdict(list)
-        for img in patient.images.all():
-            image_groups[img.stage].append(img)
-            
-        all_patients = list(
-            Patient.objects.order_by("patient_id").values_list("patient_id", flat=True)
-        )
-        index = all_patients.index(patient.patient_id)
-        prev_patient_id = all_patients[index - 1] if index > 0 else None
-        next_patient_id = (
-            all_patients[index + 1] if index < len(all_patients) - 1 else None
-        )
+        # Group images by stage (only evaluated on a gallery cache miss)
+        def group_images():
+            image_groups = defaultdict(list)
+            for img in patient.images.all():
+                image_groups[img.stage].append(img)
+            return dict(image_groups)
 
         context = {
             "patient": patient,
             "annotation": annotation,
             "form": form,
-            "image_groups": dict(image_groups),
+            "image_groups": SimpleLazyObject(group_images),
             "stages": ["early", "mid", "late"],
             "shared_comments": shared_comments,
             "previous_annotation": previous_annotation,
             "next_patient_id": next_patient_id,
             "prev_patient_id": prev_patient_id,
+            "prev_url": queue_url(prev_patient_id, project, cohort),
+            "next_url": queue_url(next_patient_id, project, cohort),
+            **queue,
+            "gallery_version": versions["gallery"],
+            "comments_version": versions["comments"],
         }
 
-        return render(request, "annotation_page.html", context)
+        response = render(request, "annotation_page.html", context)
+        response["ETag"] = etag
+        if versions["last_modified"]:
+            response["Last-Modified"] = http_date(versions["last_modified"])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     # ----------------------------
     # POST
@@ -195,6 +265,7 @@ class AnnotationQueueView(LoginRequiredMixin, View):
             # Submit & Next = final annotation
             if action == "save_and_next":
                 annotation.annotated_at = timezone.now()
+                annotation.submitted_at = annotation.annotated_at
 
                 comment_text = form.cleaned_data.get("comment")
                 if comment_text:
@@ -211,82 +282,94 @@ class AnnotationQueueView(LoginRequiredMixin, View):
             f"Annotations saved for {annotation.patient.patient_id}"
         )
 
+        cohort = self.get_cohort(request)
+        project = annotation.patient.project
+
         # Load next unannotated patient
         if action == "save_and_next":
-            annotated_ids = Annotation.objects.filter(
-                user=request.user,
-                annotated_at__isnull=False
-            ).values_list("patient__patient_id", flat=True)
-
-            next_patient = Patient.objects.exclude(
-                patient_id__in=annotated_ids
-            ).order_by("patient_id").first()
+            next_patient = self.next_unannotated(request.user, project, cohort)
 
             if next_patient:
-                return redirect(
-                    f"{reverse('annotation_queue')}?patient_id={next_patient.patient_id}"
-                )
+                return redirect(queue_url(next_patient.patient_id, project, cohort))
 
             messages.success(request, "All patients annotated.")
-            return redirect("annotation_queue")
+            return redirect(queue_url(None, project, cohort))
 
         # Just save
-        return redirect(
-            f"{reverse('annotation_queue')}?patient_id={annotation.patient.patient_id}"
-        )
+        return redirect(queue_url(annotation.patient.patient_id, project, cohort))
 
     # ----------------------------
-    # Google Drive Sync
+    # Queue helpers
     # ----------------------------
-    def sync_drive(self):
-
-        SERVICE_ACCOUNT_FILE = os.path.join(
-            settings.BASE_DIR,
-            "service-account.json"
-        )
-
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE,
-            scopes=["https://www.googleapis.com/auth/drive.readonly"]
-        )
+    def get_project(self, request):
+        slug = request.GET.get("project") or request.POST.get("project")
+        if slug:
+            return get_object_or_404(Project, slug=slug)
+        # No project chosen: fall back to the oldest one
+        return Project.objects.order_by("id").first()
+
+    def queue_context(self, project, cohort):
+        """
+        Links shared by the annotation and queue-complete pages, all
+        carrying the current project and cohort.
+        """
+        return {
+            "project": project,
+            "cohort": cohort,
+            "exit_url": queue_url(None, project, cohort),
+            "sync_url": (
+                f"{queue_url(None, project, cohort)}&sync=true"
+                if project else None
+            ),
+            "projects": [
+                {
+                    "slug": p.slug,
+                    "name": p.name,
+                    "url": queue_url(None, p),
+                    "current": project is not None and p.pk == project.pk,
+                }
+                for p in Project.objects.order_by("name")
+            ],
+        }
 
-        service = build("drive", "v3", credentials=credentials)
+    def get_cohort(self, request):
+        name = request.GET.get("cohort") or request.POST.get("cohort")
+        if not name:
+            return None
+        return get_object_or_404(Cohort, name=name)
+
+    def next_unannotated(self, user, project, cohort):
+        if cohort:
+            patient_id = cohorts.first_unannotated(cohort, user)
+            return Patient.objects.filter(
+                project=project, patient_id=patient_id
+            ).first()
 
-        results = service.files().list(
-            q=f"'{MAIN_FOLDER_ID}' in parents and mimeType='{FOLDER_MIME}'",
-            fields="files(id, name)"
-        ).execute()
+        # Patients already annotated by this user
+        annotated = Annotation.objects.filter(
+            user=user,
+            submitted_at__isnull=False
+        ).values("patient")
 
-        folders = results.get("files", [])
+        return Patient.objects.filter(project=project).exclude(
+            pk__in=annotated
+        ).order_by("patient_id").first()
 
-        folders.sort(
-            key=lambda x: [
-                int(t) if t.isdigit() else t
-                for t in re.split(r"(\d+)", x["name"])
-            ]
-        )
 
-        for folder in folders:
-            patient_id = folder["name"].strip().upper()
-            patient, _ = Patient.objects.get_or_create(
-                patient_id=patient_id
-            )
+# ================================
+# Telemetry Ingestion
+# ================================
+class TelemetryView(LoginRequiredMixin, View):
+    """Accepts batched page events posted by annotation_page.js."""
 
-            collected = []
-            fetch_images_recursive(
-                service,
-                folder["id"],
-                patient,
-                collected,
-                folder_name=folder["name"]
-            )
+    def post(self, request):
+        try:
+            events = json.loads(request.POST.get("events", "[]"))
+        except ValueError:
+            return JsonResponse({"error": "invalid events"}, status=400)
 
-            with transaction.atomic():
-                PatientImage.objects.filter(
-                    patient=patient
-                ).delete()
-                PatientImage.objects.bulk_create(collected)
+        if not isinstance(events, list):
+            return JsonResponse({"error": "invalid events"}, status=400)
 
-            print(
-                f"[SYNC] {patient_id}: {len(collected)} images"
-            )
+        stored = ingest_events(request.user, events)
+        return JsonResponse({"stored": stored})